@@ -7,7 +7,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import force_text
 
 
-from .models import Follow, Like, Post, User
+from .models import Follow, FollowEdge, Like, Post, User
 
 
 class LikesAdmin(admin.ModelAdmin):
@@ -17,12 +17,20 @@ class LikesAdmin(admin.ModelAdmin):
 
 class PostAdmin(admin.ModelAdmin):
     list_filter = []
-    list_display = ("id", "creator", "content", "pub_date")
+    list_display = ("id", "creator", "content", "pub_date", "likes_count", "unlikes_count")
+
+
+class FollowEdgeInline(admin.TabularInline):
+    model = FollowEdge
+    fk_name = "follow"
+    fields = ("followee",)
+    raw_id_fields = ("followee",)
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ("id", "user")
     list_display_links = ('user',)
+    inlines = [FollowEdgeInline]
 
 
 admin.site.register(Follow, FollowAdmin)
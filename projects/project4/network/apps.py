@@ -1,7 +1,11 @@
 from django.apps import AppConfig
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.utils.translation import ugettext_lazy as _
-from .signals import following_changed
+from .signals import (
+    follow_edge_deleted, follow_edge_saved, following_changed, like_deleted,
+    like_saved, post_broadcast, post_changed, post_created, post_tags_changed,
+    timeline_following_changed,
+)
 
 
 class NetworkConfig(AppConfig):
@@ -14,3 +18,20 @@ class NetworkConfig(AppConfig):
             sender=follow.following.through,
             dispatch_uid="check_following"
         )
+        m2m_changed.connect(
+            timeline_following_changed,
+            sender=follow.following.through,
+            dispatch_uid="timeline_following"
+        )
+        follow_edge = self.get_model("FollowEdge")
+        post_save.connect(follow_edge_saved, sender=follow_edge, dispatch_uid="follow_edge_saved")
+        post_delete.connect(follow_edge_deleted, sender=follow_edge, dispatch_uid="follow_edge_deleted")
+        like = self.get_model("Like")
+        post_save.connect(like_saved, sender=like, dispatch_uid="like_saved")
+        post_delete.connect(like_deleted, sender=like, dispatch_uid="like_deleted")
+        post = self.get_model("Post")
+        post_save.connect(post_created, sender=post, dispatch_uid="post_created")
+        post_save.connect(post_broadcast, sender=post, dispatch_uid="post_broadcast")
+        post_save.connect(post_tags_changed, sender=post, dispatch_uid="post_tags_changed")
+        post_save.connect(post_changed, sender=post, dispatch_uid="post_edited")
+        post_delete.connect(post_changed, sender=post, dispatch_uid="post_deleted")
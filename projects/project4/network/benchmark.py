@@ -0,0 +1,123 @@
+"""
+Helpers to load test the network app over HTTP and through the test
+client, see the bench_servers and bench_network management commands.
+"""
+import http.client
+import math
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+def percentile(values, pct):
+    """Return the pct percentile of values (nearest rank)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarize(latencies, errors, elapsed):
+    """Return throughput and latency percentiles (in ms) of a load run"""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def run_load(url, requests, concurrency, headers=None, method="GET", body=None):
+    """
+    Send requests requests to url from concurrency threads, each keeping its
+    own connection alive, and return the summarize() of the run
+    """
+    parts = urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def worker():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                connection.request(method, target, body=body, headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def run_client(client, requests, method="GET", path="/", **extra):
+    """
+    Send requests requests through a Django test Client, one at a time, and
+    return the summarize() of the run
+    """
+    latencies = []
+    errors = 0
+    send = getattr(client, method.lower())
+    start = time.perf_counter()
+    for _ in range(requests):
+        request_start = time.perf_counter()
+        response = send(path, **extra)
+        if response.status_code < 400:
+            latencies.append(time.perf_counter() - request_start)
+        else:
+            errors += 1
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} didn't start within {timeout}s")
+
+
+@contextmanager
+def serve(args, port, cwd=None, env=None):
+    """Run a server command (args after the python executable) until exit"""
+    process = subprocess.Popen(
+        [sys.executable, *args], cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
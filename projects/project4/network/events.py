@@ -0,0 +1,166 @@
+"""
+Server-sent events stream of new posts.
+
+events_app is a plain ASGI app, routed in project4/asgi.py, so every
+connected client is a coroutine waiting on its own queue rather than a
+thread. New posts reach the queues through the process-wide hub, whose
+backend (NETWORK_EVENTS_BACKEND) decides how posts made by other worker
+processes are seen:
+
+- LocalBackend delivers posts published by this process only
+- DatabaseBackend polls the Post table from one task per process, so all
+  workers see every post at the cost of one query per interval per process
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Seconds between keepalive comments sent to idle clients
+KEEPALIVE_INTERVAL = 15
+# Messages buffered per client before new ones are dropped for it
+QUEUE_SIZE = 100
+
+
+def post_summary(post):
+    """Return the message sent to clients about a new post"""
+    return {
+        "id": post.id,
+        "creator": post.creator.username,
+        "pub_date": post.pub_date.isoformat(),
+    }
+
+
+class LocalBackend:
+    """Broadcast posts published by this process to its own clients"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    async def start(self):
+        pass
+
+    def publish(self, message):
+        self.hub.deliver_threadsafe(message)
+
+
+class DatabaseBackend:
+    """Broadcast posts from any process by polling the Post table"""
+
+    interval = 1
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.last_id = None
+
+    def fetch_new(self):
+        """Return summaries of the posts created since the last poll"""
+        from .models import Post
+
+        if self.last_id is None:
+            self.last_id = Post.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            return []
+        posts = list(Post.objects.select_related("creator").filter(id__gt=self.last_id).order_by("id"))
+        if posts:
+            self.last_id = posts[-1].id
+        return [post_summary(post) for post in posts]
+
+    async def start(self):
+        asyncio.ensure_future(self.poll())
+
+    async def poll(self):
+        while True:
+            for message in await sync_to_async(self.fetch_new)():
+                self.hub.deliver(message)
+            await asyncio.sleep(self.interval)
+
+    def publish(self, message):
+        # Every process picks the post up from the table
+        pass
+
+
+class Hub:
+    """Hand each broadcast message to the queue of every connected client"""
+
+    def __init__(self, backend_class):
+        self.queues = set()
+        self.loop = None
+        self.backend = backend_class(self)
+
+    async def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            await self.backend.start()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+
+    def deliver(self, message):
+        """Queue a message for every client, must run on the hub's loop"""
+        for queue in self.queues:
+            if not queue.full():
+                queue.put_nowait(message)
+
+    def deliver_threadsafe(self, message):
+        """Queue a message for every client from any thread"""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.deliver, message)
+
+    def publish(self, message):
+        """Broadcast a message, safe to call from sync code"""
+        self.backend.publish(message)
+
+
+hub = Hub(import_string(getattr(settings, "NETWORK_EVENTS_BACKEND", "network.events.LocalBackend")))
+
+
+def format_event(message):
+    """Return a message as a server-sent event"""
+    return f"id: {message['id']}\nevent: post\ndata: {json.dumps(message)}\n\n".encode()
+
+
+async def events_app(scope, receive, send, hub=hub):
+    """ASGI app streaming new posts as server-sent events until disconnect"""
+    queue = await hub.subscribe()
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected},
+                timeout=KEEPALIVE_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                if disconnected.result()["type"] == "http.disconnect":
+                    message.cancel()
+                    break
+                # The (empty) request body, wait for the next message
+                disconnected = asyncio.ensure_future(receive())
+            if message in done:
+                body = format_event(message.result())
+            else:
+                message.cancel()
+                if done:
+                    continue
+                body = b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        hub.unsubscribe(queue)
+        disconnected.cancel()
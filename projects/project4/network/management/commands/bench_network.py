@@ -0,0 +1,146 @@
+import importlib.util
+import json
+import os
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client
+
+from network import seed
+from network.benchmark import run_client, run_load, serve
+from network.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a separate database with synthetic users, posts, likes and follows, then "
+        "measure the throughput and latency percentiles of the index, profile, following "
+        "and like endpoints through the test client and a local HTTP server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--likes", type=int, default=50000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic data")
+        parser.add_argument(
+            "--database",
+            default=os.path.join(settings.BASE_DIR, "bench.sqlite3"),
+            help="SQLite file seeded and served for the benchmark",
+        )
+        parser.add_argument(
+            "--reuse", action="store_true",
+            help="Benchmark the existing --database instead of seeding a new one",
+        )
+        parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=10, help="Concurrent HTTP clients")
+        parser.add_argument("--port", type=int, default=8703)
+        parser.add_argument("--no-http", action="store_true", help="Only use the test client")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+
+    def use_database(self, path):
+        """Point the default connection at the benchmark database"""
+        connection = connections["default"]
+        connection.close()
+        connection.settings_dict["NAME"] = path
+
+    def endpoints(self, viewer):
+        """Return (name, method, path, body) of each endpoint to measure"""
+        profile = User.objects.filter(username__startswith="bench-").order_by("-followers_count").first()
+        post = Post.objects.exclude(creator=viewer).order_by("-pub_date").first()
+        body = json.dumps({"reactions": [{"post": post.id, "like_unlike": True}]})
+        return [
+            ("index", "GET", "/", None),
+            ("profile", "GET", f"/{profile.username}", None),
+            ("following", "GET", "/following", None),
+            ("like", "POST", "/likes/bulk", body),
+        ]
+
+    def handle(self, *args, **options):
+        path = options["database"]
+        self.use_database(path)
+        volumes = None
+        if not (options["reuse"] and os.path.exists(path)):
+            if os.path.exists(path):
+                os.remove(path)
+            call_command("migrate", verbosity=0)
+            self.stdout.write("Seeding...")
+            volumes = seed.generate(
+                users=options["users"], posts=options["posts"], likes=options["likes"],
+                follows=options["follows"], seed=options["seed"],
+            )
+            self.stdout.write(f"Seeded {volumes}")
+
+        # The user following the most accounts has the heaviest following page
+        viewer = User.objects.filter(username__startswith="bench-").order_by("-following_count").first()
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(viewer)
+        endpoints = self.endpoints(viewer)
+        results = []
+
+        for name, method, url, body in endpoints:
+            extra = {"data": body, "content_type": "application/json"} if body else {}
+            result = run_client(client, options["requests"], method, url, **extra)
+            results.append(self.report("client", name, method, url, 1, result))
+
+        if not options["no_http"]:
+            request = HttpRequest()
+            csrf_token = get_token(request)
+            headers = {
+                "Host": "localhost",
+                "Cookie": f"sessionid={client.cookies['sessionid'].value}; "
+                          f"{settings.CSRF_COOKIE_NAME}={request.META['CSRF_COOKIE']}",
+                "X-CSRFToken": csrf_token,
+                "Content-Type": "application/json",
+            }
+            env = {**os.environ, "DATABASE_PATH": path}
+            with serve(self.server_command(options), options["port"], cwd=settings.BASE_DIR, env=env) as base_url:
+                for name, method, url, body in endpoints:
+                    run_load(base_url + url, min(20, options["requests"]), 2, headers, method, body)  # warm up
+                    result = run_load(base_url + url, options["requests"], options["concurrency"],
+                                      headers, method, body)
+                    results.append(self.report("http", name, method, url, options["concurrency"], result))
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({
+                    "commit": self.commit(),
+                    "created": datetime.now(timezone.utc).isoformat(),
+                    "database": path,
+                    "volumes": volumes,
+                    "results": results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def report(self, mode, name, method, url, concurrency, result):
+        result.update(mode=mode, endpoint=name, method=method, path=url, concurrency=concurrency)
+        self.stdout.write(
+            f"{mode:6} {name:10} {result['rps']:>8} req/s  p50 {result['p50_ms']} ms  "
+            f"p90 {result['p90_ms']} ms  p99 {result['p99_ms']} ms  errors {result['errors']}"
+        )
+        return result
+
+    @staticmethod
+    def server_command(options):
+        port = options["port"]
+        if importlib.util.find_spec("gunicorn"):
+            return ["-m", "gunicorn", "project4.wsgi:application", "--bind", f"127.0.0.1:{port}",
+                    "--workers", "1", "--threads", str(options["concurrency"])]
+        return ["manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"]
+
+    @staticmethod
+    def commit():
+        """Return the checked out git commit, to compare results across commits"""
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
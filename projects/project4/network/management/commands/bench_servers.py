@@ -0,0 +1,59 @@
+import importlib.util
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from network.benchmark import run_load, serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/second and latency percentiles of paths served by "
+        "the WSGI and ASGI entry points under concurrent load"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Path to load, repeatable (default: / and /async/)",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--port", type=int, default=8701, help="First of two ports to serve on")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+
+    def servers(self, options):
+        """Return (name, server command) for each deployment to compare"""
+        if importlib.util.find_spec("uvicorn") is None:
+            raise CommandError("The ASGI benchmark needs uvicorn: pip install uvicorn")
+        port = options["port"]
+        if importlib.util.find_spec("gunicorn"):
+            wsgi = ["-m", "gunicorn", "project4.wsgi:application", "--bind", f"127.0.0.1:{port}",
+                    "--workers", "1", "--threads", str(options["concurrency"])]
+        else:
+            wsgi = ["manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"]
+        asgi = ["-m", "uvicorn", "project4.asgi:application", "--port", str(port + 1),
+                "--workers", "1", "--no-access-log"]
+        return [("wsgi", wsgi, port), ("asgi", asgi, port + 1)]
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or ["/", "/async/"]
+        results = []
+        for name, command, port in self.servers(options):
+            with serve(command, port, cwd=settings.BASE_DIR) as base_url:
+                for path in paths:
+                    run_load(base_url + path, min(50, options["requests"]), 5)  # warm up
+                    result = run_load(base_url + path, options["requests"], options["concurrency"])
+                    result.update(server=name, path=path, concurrency=options["concurrency"])
+                    results.append(result)
+                    self.stdout.write(
+                        f"{name:5} {path:20} {result['rps']:>8} req/s  "
+                        f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  "
+                        f"errors {result['errors']}"
+                    )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from network.recommendations import rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = "Recompute the \"who to follow\" suggestions of every user"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Users whose suggestions are computed per statement",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        batches = 0
+        for first, last in rebuild_suggestions(batch_size=options["batch_size"]):
+            batches += 1
+            self.stdout.write(f"Suggestions built for users {first} to {last}")
+        self.stdout.write(self.style.SUCCESS(f"Built suggestions in {batches} batch(es)"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from network.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.likes_count/unlikes_count where they drifted from the Like table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of drifted posts",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = Post.objects.drifted()
+            total = drifted.count()
+            if total and not options["dry_run"]:
+                Post.objects.filter(id__in=drifted.values("id")).recount()
+
+        action = "Found" if options["dry_run"] else "Reconciled"
+        self.stdout.write(self.style.SUCCESS(f"{action} {total} drifted post(s)"))
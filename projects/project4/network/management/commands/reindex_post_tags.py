@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.models import Post
+from network.tags import index_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the hashtag and mention index of every post in id order, in batches. "
+        "The last indexed id is saved to the checkpoint file after every batch so an "
+        "interrupted run picks up where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Posts indexed per transaction",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="reindex_post_tags.checkpoint",
+            help="File holding the last indexed post id",
+        )
+        parser.add_argument(
+            "--resume-from",
+            type=int,
+            help="Index posts with an id above this one, instead of the checkpoint's",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and index every post",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        checkpoint = Path(options["checkpoint"])
+
+        last_id = 0
+        if options["resume_from"] is not None:
+            last_id = options["resume_from"]
+        elif checkpoint.exists() and not options["restart"]:
+            try:
+                last_id = int(checkpoint.read_text().strip() or 0)
+            except ValueError:
+                raise CommandError(f"Invalid checkpoint file {checkpoint}")
+
+        total = 0
+        while True:
+            batch = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "content", "pub_date")[:options["batch_size"]]
+            )
+            if not batch:
+                break
+            index_posts(batch)
+            last_id = batch[-1].id
+            total += len(batch)
+            checkpoint.write_text(str(last_id))
+            self.stdout.write(f"Indexed {total} post(s), up to id {last_id}")
+
+        if checkpoint.exists():
+            checkpoint.unlink()
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {total} post(s)"))
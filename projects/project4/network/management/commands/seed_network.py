@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network import seed
+from network.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load synthetic users, posts, likes and follows, e.g. millions of rows "
+        "for load tests. Every user's password is \"password\"."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--likes", type=int, default=1000000)
+        parser.add_argument("--follows", type=int, default=200000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic data")
+        parser.add_argument("--prefix", default="seed", help="Usernames are <prefix>-<n>")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("--users must be at least 1")
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users named {options['prefix']}-<n> exist already, pick another --prefix")
+
+        start = time.perf_counter()
+
+        def progress(message):
+            self.stdout.write(f"{time.perf_counter() - start:8.1f}s  {message}")
+
+        totals = seed.generate(
+            users=options["users"], posts=options["posts"], likes=options["likes"],
+            follows=options["follows"], seed=options["seed"], prefix=options["prefix"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['users']} users, {totals['posts']} posts, {totals['likes']} likes "
+            f"and {totals['follows']} follows in {time.perf_counter() - start:.1f}s"
+        ))
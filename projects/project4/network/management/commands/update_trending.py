@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network import trending
+
+
+class Command(BaseCommand):
+    help = "Fold the likes/unlikes since the last run into the trending post scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Like changes folded per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Keep running, updating the scores every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        while True:
+            folded = trending.update_scores(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Folded {folded} like change(s) into the trending scores"))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
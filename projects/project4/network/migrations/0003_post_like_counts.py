@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_counts(apps, schema_editor):
+    Like = apps.get_model('network', 'Like')
+    Post = apps.get_model('network', 'Post')
+
+    def total(like_unlike):
+        likes = (
+            Like.objects.filter(post=OuterRef('pk'), like_unlike=like_unlike)
+            .order_by().values('post').annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(likes), 0)
+
+    Post.objects.update(likes_count=total(True), unlikes_count=total(False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0002_auto_20210621_1545'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='unlikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
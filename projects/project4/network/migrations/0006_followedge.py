@@ -0,0 +1,92 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def copy_to_follow_edges(apps, schema_editor):
+    """Move the rows of the implicit Follow.following table into FollowEdge"""
+    Follow = apps.get_model('network', 'Follow')
+    FollowEdge = apps.get_model('network', 'FollowEdge')
+    rows = Follow.following.through.objects.values_list('follow_id', 'follow__user_id', 'user_id')
+    edges = (
+        FollowEdge(follow_id=follow_id, follower_id=follower_id, followee_id=followee_id)
+        for follow_id, follower_id, followee_id in rows.iterator()
+    )
+    FollowEdge.objects.bulk_create(edges, batch_size=1000)
+
+
+def copy_from_follow_edges(apps, schema_editor):
+    Follow = apps.get_model('network', 'Follow')
+    FollowEdge = apps.get_model('network', 'FollowEdge')
+    Through = Follow.following.through
+    rows = (
+        Through(follow_id=follow_id, user_id=followee_id)
+        for follow_id, followee_id in FollowEdge.objects.values_list('follow_id', 'followee_id').iterator()
+    )
+    Through.objects.bulk_create(rows, batch_size=1000)
+
+
+def backfill_follow_counts(apps, schema_editor):
+    FollowEdge = apps.get_model('network', 'FollowEdge')
+    User = apps.get_model('network', 'User')
+
+    def total(field):
+        edges = (
+            FollowEdge.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(edges), 0)
+
+    User.objects.update(following_count=total('follower'), followers_count=total('followee'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowEdge',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('follow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='network.follow')),
+                ('followee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_edges', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='followedge',
+            index=models.Index(fields=['followee', 'follower'], name='follow_edge_followee_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='followedge',
+            constraint=models.UniqueConstraint(fields=('follower', 'followee'), name='unique follow edge'),
+        ),
+        migrations.RunPython(copy_to_follow_edges, copy_from_follow_edges),
+        migrations.RemoveField(
+            model_name='follow',
+            name='following',
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='following',
+            field=models.ManyToManyField(related_name='following', through='network.FollowEdge', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:12
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def delete_self_follows(apps, schema_editor):
+    """Drop any self-follows which slipped past the old m2m_changed check"""
+    FollowEdge = apps.get_model('network', 'FollowEdge')
+    FollowEdge.objects.filter(follower=models.F('followee')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0006_followedge'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_self_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='followedge',
+            constraint=models.CheckConstraint(check=models.Q(('follower', django.db.models.expressions.F('followee')), _negated=True), name='cannot follow oneself'),
+        ),
+    ]
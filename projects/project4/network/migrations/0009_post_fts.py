@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from ._fts import create_index, drop_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0008_posttag_mention'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,74 @@
+"""
+SQLite FTS5 index of Post.content, see network/search.py.
+
+network_post_fts is an external content table over network_post kept in
+sync by triggers, so bulk_create()/update() and raw SQL are indexed too.
+SQLite drops a table's triggers when Django remakes it to alter its
+columns, so migrations altering Post must call create_triggers() again.
+Bulk loads may drop the triggers and recreate them afterwards, which
+rebuilds the index in one pass, see seed.bulk_load.
+"""
+
+TABLE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS network_post_fts USING fts5(
+    content,
+    content='network_post',
+    content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS network_post_fts_insert AFTER INSERT ON network_post BEGIN
+        INSERT INTO network_post_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS network_post_fts_delete AFTER DELETE ON network_post BEGIN
+        INSERT INTO network_post_fts(network_post_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    # Only content edits touch the index, not like count updates
+    """
+    CREATE TRIGGER IF NOT EXISTS network_post_fts_update AFTER UPDATE OF content ON network_post BEGIN
+        INSERT INTO network_post_fts(network_post_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO network_post_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+TRIGGER_NAMES = ['network_post_fts_insert', 'network_post_fts_delete', 'network_post_fts_update']
+
+REBUILD_SQL = "INSERT INTO network_post_fts(network_post_fts) VALUES ('rebuild')"
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGERS_SQL:
+        schema_editor.execute(sql)
+    # Pick up any rows written while the triggers were missing
+    schema_editor.execute(REBUILD_SQL)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(TABLE_SQL)
+    create_triggers(apps, schema_editor)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in TRIGGER_NAMES:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    drop_triggers(apps, schema_editor)
+    schema_editor.execute('DROP TABLE IF EXISTS network_post_fts')
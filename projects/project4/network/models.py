@@ -1,29 +1,135 @@
+from collections import Counter, defaultdict
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
 class User(AbstractUser):
-    pass
+    # Denormalized FollowEdge totals, maintained by FollowEdge signals/queryset
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped on every change to the users followed, see PostFeedAPIView.get_etag
+    following_version = models.PositiveIntegerField(default=0, editable=False)
+
+    def follows(self, other):
+        """Return whether this user follows other"""
+        return FollowEdge.objects.filter(follower=self, followee=other).exists()
+
+
+class PostQuerySet(models.QuerySet):
+
+    @staticmethod
+    def _like_total(like_unlike):
+        """Correlated subquery counting a post's likes or unlikes"""
+        likes = (
+            Like.objects.filter(post=OuterRef("pk"), like_unlike=like_unlike)
+            .order_by()
+            .values("post")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return Coalesce(Subquery(likes), 0)
+
+    def for_viewer(self, user):
+        """
+        Join each post's creator and annotate viewer_reaction with the
+        user's like_unlike for it (None when not reacted or anonymous)
+        """
+        posts = self.select_related("creator")
+        if not user.is_authenticated:
+            return posts.annotate(viewer_reaction=Value(None, output_field=models.BooleanField(null=True)))
+        reaction = Like.objects.filter(post=OuterRef("pk"), user=user).values("like_unlike")[:1]
+        return posts.annotate(viewer_reaction=Subquery(reaction, output_field=models.BooleanField(null=True)))
+
+    def with_actual_counts(self):
+        """Annotate the like/unlike totals as counted from the Like table"""
+        return self.annotate(
+            actual_likes=self._like_total(True),
+            actual_unlikes=self._like_total(False),
+        )
+
+    def drifted(self):
+        """Posts whose stored counters disagree with the Like table"""
+        return self.with_actual_counts().exclude(
+            likes_count=F("actual_likes"),
+            unlikes_count=F("actual_unlikes"),
+        )
+
+    def add_to_counts(self, deltas):
+        """
+        Add per-post (likes, unlikes) deltas, a mapping of post id to pair,
+        to the stored counters in one UPDATE
+        """
+        if not deltas:
+            return 0
+        PostActivity.objects.bulk_create([
+            PostActivity(post_id=post_id, likes=likes, unlikes=unlikes)
+            for post_id, (likes, unlikes) in deltas.items()
+        ])
+
+        def delta(field, index):
+            whens = [When(id=post_id, then=Value(pair[index])) for post_id, pair in deltas.items()]
+            return F(field) + Case(*whens, default=Value(0), output_field=models.IntegerField())
+
+        return self.filter(id__in=deltas).update(
+            likes_count=delta("likes_count", 0),
+            unlikes_count=delta("unlikes_count", 1),
+        )
+
+    def recount(self):
+        """Recompute the stored counters from the Like table in one UPDATE"""
+        return self.update(
+            likes_count=self._like_total(True),
+            unlikes_count=self._like_total(False),
+        )
 
 
 class Post(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name="creator")
     content = models.CharField(max_length=160)
     pub_date = models.DateTimeField('date posted', default=timezone.now)
+    # Denormalized Like totals, maintained by the Like signals/queryset
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    unlikes_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            # Keyset pagination of the feeds, see pagination.paginate_by_cursor
+            models.Index(fields=["-pub_date", "-id"], name="post_feed_idx"),
+            models.Index(fields=["creator", "-pub_date", "-id"], name="post_profile_feed_idx"),
+        ]
 
-    @property
-    def likes_count(self):
-        return self.likes.filter(like_unlike=True).count()
+    @staticmethod
+    def count_field(like_unlike):
+        """Return the name of the counter column for a like/unlike"""
+        return "likes_count" if like_unlike else "unlikes_count"
 
-    @property
-    def unlikes_count(self):
-        return self.likes.filter(like_unlike=False).count()
+    @classmethod
+    def adjust_count(cls, post_id, like_unlike, delta):
+        """Atomically add delta to the like or unlike counter of a post"""
+        field = cls.count_field(like_unlike)
+        cls.objects.filter(id=post_id).update(**{field: F(field) + delta})
+        PostActivity.objects.create(post_id=post_id, **{"likes" if like_unlike else "unlikes": delta})
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "creator": self.creator.username,
+            "content": self.content,
+            "pub_date": self.pub_date.isoformat(),
+            "likes_count": self.likes_count,
+            "unlikes_count": self.unlikes_count,
+            "viewer_reaction": getattr(self, "viewer_reaction", None),
+        }
 
     def __str__(self):
         return f"{self.id} - By {self.creator}"
@@ -32,11 +138,144 @@ class Post(models.Model):
 BOOL_CHOICES = ((True, "like"), (False, "unlike"))
 
 
+class LikeQuerySet(models.QuerySet):
+    """
+    Keep Post.likes_count/unlikes_count in step with bulk operations that
+    bypass the model signals. Deletes (bulk and cascade) still send
+    post_delete, see signals.like_deleted.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get("ignore_conflicts"):
+                # Skipped rows can't be told apart, recount the touched posts
+                Post.objects.filter(id__in={like.post_id for like in objs}).recount()
+            else:
+                totals = Counter((like.post_id, like.like_unlike) for like in objs)
+                for (post_id, like_unlike), total in totals.items():
+                    Post.adjust_count(post_id, like_unlike, total)
+        return created
+
+    def update(self, **kwargs):
+        if "like_unlike" not in kwargs:
+            return super().update(**kwargs)
+
+        new_value = kwargs["like_unlike"]
+        with transaction.atomic(using=self.db):
+            # Only rows that actually flip move between the two counters
+            flipped = (
+                self.exclude(like_unlike=new_value)
+                .order_by()
+                .values("post")
+                .annotate(total=Count("id"))
+            )
+            for row in flipped:
+                Post.adjust_count(row["post"], new_value, row["total"])
+                Post.adjust_count(row["post"], not new_value, -row["total"])
+            return super().update(**kwargs)
+
+
+    def upsert_for_user(self, user, reactions):
+        """
+        Like/unlike many posts for user in one go, reactions being an iterable
+        of (post id, like_unlike) pairs where the last pair for a post wins.
+        like_unlike is a bool or "true"/"false", anything else raises
+        ValueError.
+
+        The "cannot like own post" rule and the posts' existence are checked
+        with one query, then new and changed reactions are written with an
+        INSERT ... ON CONFLICT upsert on the "unique like" columns.
+        Returns the number of likes created or changed.
+        """
+        reactions = {int(post_id): self._parse_reaction(like_unlike) for post_id, like_unlike in reactions}
+        creators = dict(Post.objects.filter(id__in=reactions).values_list("id", "creator_id"))
+        errors = {}
+        for post_id in reactions:
+            if post_id not in creators:
+                errors[post_id] = "Post does not exist"
+            elif creators[post_id] == user.id:
+                errors[post_id] = "User cannot like/unlike their own post"
+        if errors:
+            raise ValidationError(errors)
+
+        with transaction.atomic(using=self.db):
+            existing = dict(
+                self.filter(user=user, post_id__in=reactions).values_list("post_id", "like_unlike")
+            )
+            changed = {
+                post_id: like_unlike for post_id, like_unlike in reactions.items()
+                if existing.get(post_id) != like_unlike
+            }
+            self._upsert(user.id, changed)
+
+            deltas = {}
+            for post_id, like_unlike in changed.items():
+                likes, unlikes = (1, 0) if like_unlike else (0, 1)
+                if post_id in existing:
+                    # A flip moves the reaction from the other counter
+                    likes, unlikes = (1, -1) if like_unlike else (-1, 1)
+                deltas[post_id] = (likes, unlikes)
+            Post.objects.add_to_counts(deltas)
+        return len(changed)
+
+    @staticmethod
+    def _parse_reaction(like_unlike):
+        """Return like_unlike given as a bool or "true"/"false" as a bool"""
+        if isinstance(like_unlike, bool):
+            return like_unlike
+        if like_unlike in ("true", "false"):
+            return like_unlike == "true"
+        raise ValueError(f"Invalid like_unlike: {like_unlike!r}")
+
+    def _upsert(self, user_id, reactions, batch_size=300):
+        """Write the {post id: like_unlike} reactions of a user"""
+        connection = connections[self.db]
+        if connection.vendor not in ("sqlite", "postgresql"):
+            # No ON CONFLICT ... DO UPDATE, update existing rows then insert
+            for like_unlike in (True, False):
+                post_ids = [post_id for post_id, value in reactions.items() if value == like_unlike]
+                models.QuerySet.update(
+                    self.filter(user_id=user_id, post_id__in=post_ids), like_unlike=like_unlike)
+            existing = set(self.filter(user_id=user_id, post_id__in=reactions).values_list("post_id", flat=True))
+            models.QuerySet.bulk_create(self, [
+                Like(user_id=user_id, post_id=post_id, like_unlike=like_unlike)
+                for post_id, like_unlike in reactions.items() if post_id not in existing
+            ])
+            return
+
+        qn = connection.ops.quote_name
+        meta = Like._meta
+        columns = [meta.get_field(name).column for name in ("user", "post", "like_unlike")]
+        rows = list(reactions.items())
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                sql = (
+                    f"INSERT INTO {qn(meta.db_table)} ({', '.join(map(qn, columns))}) "
+                    f"VALUES {', '.join(['(%s, %s, %s)'] * len(batch))} "
+                    f"ON CONFLICT ({qn(columns[0])}, {qn(columns[1])}) "
+                    f"DO UPDATE SET {qn(columns[2])} = excluded.{qn(columns[2])}"
+                )
+                params = [value for post_id, like_unlike in batch for value in (user_id, post_id, like_unlike)]
+                cursor.execute(sql, params)
+
+
 class Like(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="likes")
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     like_unlike = models.BooleanField(choices=BOOL_CHOICES, null=False)
 
+    objects = LikeQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored like_unlike so signals can detect a flip"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_like_unlike = instance.__dict__.get("like_unlike")
+        return instance
+
     @property
     def like_unlike_wording(self):
         return "like" if self.like_unlike else "unlike"
@@ -61,7 +300,12 @@ class Like(models.Model):
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    following = models.ManyToManyField(User, related_name="following")
+    following = models.ManyToManyField(
+        User,
+        related_name="following",
+        through="FollowEdge",
+        through_fields=("follow", "followee"),
+    )
 
     class Meta:
         constraints = [
@@ -71,3 +315,231 @@ class Follow(models.Model):
 
     def __str__(self):
         return f"Follow #{self.id} - {self.user}'s follows list"
+
+
+class FollowEdgeQuerySet(models.QuerySet):
+    """
+    Fill in FollowEdge.follower and keep the User follow counters in step with
+    bulk_create, which Follow.following.add() uses. Deletes (bulk and cascade)
+    send post_delete, see signals.follow_edge_deleted.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        missing = {edge.follow_id for edge in objs if edge.follower_id is None}
+        if missing:
+            follow_users = dict(Follow.objects.using(self.db).filter(id__in=missing).values_list("id", "user_id"))
+            for edge in objs:
+                if edge.follower_id is None:
+                    edge.follower_id = follow_users[edge.follow_id]
+
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get("ignore_conflicts"):
+                # Skipped rows can't be told apart, recount the touched users
+                touched = {edge.follower_id for edge in objs} | {edge.followee_id for edge in objs}
+                self.recount(touched)
+            else:
+                FollowEdge.adjust_counts(
+                    Counter(edge.follower_id for edge in objs),
+                    Counter(edge.followee_id for edge in objs),
+                    using=self.db,
+                )
+        return created
+
+    def recount(self, user_ids):
+        """Recompute the follow counters of user_ids from the edge table"""
+        def total(field):
+            edges = (
+                self.model.objects.using(self.db).filter(**{field: OuterRef("pk")})
+                .order_by()
+                .values(field)
+                .annotate(total=Count("id"))
+                .values("total")
+            )
+            return Coalesce(Subquery(edges), 0)
+
+        User.objects.using(self.db).filter(id__in=user_ids).update(
+            following_count=total("follower"),
+            followers_count=total("followee"),
+        )
+
+
+class FollowEdge(models.Model):
+    """One user following another, the through table of Follow.following"""
+    follow = models.ForeignKey(Follow, on_delete=models.CASCADE, related_name="edges")
+    # Copy of follow.user so both directions of the graph are indexed
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following_edges")
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name="follower_edges")
+
+    objects = FollowEdgeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Prevent a user from following the same user twice, also serves
+            # as the (follower, followee) index
+            models.UniqueConstraint(fields=['follower', 'followee'], name="unique follow edge"),
+            # Prevent a user from following themselves
+            models.CheckConstraint(check=~Q(follower=F('followee')), name="cannot follow oneself"),
+        ]
+        indexes = [
+            models.Index(fields=["followee", "follower"], name="follow_edge_followee_idx"),
+        ]
+
+    @staticmethod
+    def adjust_counts(following, followers, sign=1, using=DEFAULT_DB_ALIAS):
+        """
+        Atomically add the per-user totals in following/followers (mappings
+        of user id to number of edges) to the User follow counters
+        """
+        for field, totals in (("following_count", following), ("followers_count", followers)):
+            # One UPDATE per distinct total, usually a single one
+            by_total = defaultdict(list)
+            for user_id, total in totals.items():
+                by_total[total].append(user_id)
+            for total, user_ids in by_total.items():
+                changes = {field: F(field) + sign * total}
+                if field == "following_count":
+                    changes["following_version"] = F("following_version") + 1
+                User.objects.using(using).filter(id__in=user_ids).update(**changes)
+
+    def save(self, *args, **kwargs):
+        if self.follower_id is None:
+            self.follower_id = self.follow.user_id
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.follower} follows {self.followee}"
+
+
+class TimelineEntry(models.Model):
+    """A post pushed into a follower's "following" timeline, see timeline.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    # Copy of post.pub_date so a timeline can be ordered/pruned without a join
+    pub_date = models.DateTimeField('date posted')
+
+    class Meta:
+        ordering = ["-pub_date", "-post_id"]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name="unique timeline entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"], name="timeline_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"Post #{self.post_id} in {self.user}'s timeline"
+
+
+class PostTag(models.Model):
+    """A #hashtag used in a post, see tags.py"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="tags")
+    tag = models.CharField(max_length=50)
+    # Copy of post.pub_date so a tag's posts are read in feed order from the index
+    pub_date = models.DateTimeField('date posted')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'tag'], name="unique post tag"),
+        ]
+        indexes = [
+            models.Index(fields=["tag", "-pub_date", "-post"], name="post_tag_idx"),
+        ]
+
+    def __str__(self):
+        return f"Post #{self.post_id} - #{self.tag}"
+
+
+class Mention(models.Model):
+    """An @mention of a user in a post, see tags.py"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="mentions")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="mentions")
+    # Copy of post.pub_date so a user's mentions are read in feed order from the index
+    pub_date = models.DateTimeField('date posted')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name="unique mention"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"], name="mention_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"Post #{self.post_id} - @{self.user}"
+
+
+class PostActivity(models.Model):
+    """
+    A change to a post's like/unlike counters not yet folded into its
+    trending score, see trending.py
+    """
+    # No constraint, rows logged while a post is being deleted are just skipped
+    post = models.ForeignKey(Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    likes = models.IntegerField(default=0)
+    unlikes = models.IntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Post #{self.post_id} {self.likes:+} likes {self.unlikes:+} unlikes"
+
+
+class PostScore(models.Model):
+    """The decayed trending score of a post with recent likes, see trending.py"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name="trending")
+    score = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score"], name="post_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"Post #{self.post_id} - {self.score}"
+
+
+class TrendingCheckpoint(models.Model):
+    """Progress of the trending job, a single row"""
+    last_activity_id = models.PositiveBigIntegerField(default=0)
+    # Time at which an activity is worth its plain weight, see trending.weight
+    epoch = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Activity #{self.last_activity_id}, epoch {self.epoch}"
+
+
+class FeedVersion(models.Model):
+    """
+    Counter of the post edits and deletes, a single row, which the feed
+    ETags include as new posts and likes don't reveal them
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F("version") + 1):
+            cls.objects.get_or_create(pk=1, defaults={"version": 1})
+
+    def __str__(self):
+        return f"Feed version {self.version}"
+
+
+class FollowSuggestion(models.Model):
+    """A user suggested to follow, precomputed by recommendations.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="follow_suggestions")
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    # Number of the user's followees who follow the candidate
+    mutuals = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name="unique follow suggestion"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-score"], name="follow_suggestion_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate} for {self.user} ({self.score})"
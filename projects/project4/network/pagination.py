@@ -0,0 +1,177 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(pub_date, pk, reverse=False):
+    """Return an opaque cursor for the (pub_date, id) position of a post"""
+    position = {"d": pub_date.isoformat(), "i": pk, "r": reverse}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (pub_date, id, reverse) position held by a cursor"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pub_date = parse_datetime(position["d"])
+        pk = int(position["i"])
+        reverse = bool(position["r"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if pub_date is None:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return pub_date, pk, reverse
+
+
+class CursorPage:
+    """A page of posts addressed by cursors instead of page numbers"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(last.pub_date, last.pk)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        first = self.object_list[0]
+        return encode_cursor(first.pub_date, first.pk, reverse=True)
+
+
+def seek(queryset, page_size, position=None, reverse=False, pk_field="id"):
+    """
+    Return up to page_size + 1 rows of a queryset in feed order, newest first
+    or oldest first when reverse, which come after a (pub_date, pk) position.
+    """
+    if position is None:
+        order = ("pub_date", pk_field) if reverse else ("-pub_date", f"-{pk_field}")
+        return list(queryset.order_by(*order)[:page_size + 1])
+
+    pub_date, pk = position
+    # The redundant pub_date bounds let the index seek to the cursor
+    if reverse:
+        newer = Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, **{f"{pk_field}__gt": pk})
+        return list(queryset.filter(newer, pub_date__gte=pub_date).order_by("pub_date", pk_field)[:page_size + 1])
+
+    older = Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, **{f"{pk_field}__lt": pk})
+    return list(queryset.filter(older, pub_date__lte=pub_date).order_by("-pub_date", f"-{pk_field}")[:page_size + 1])
+
+
+class EntryFeed:
+    """
+    A feed of posts listed by a table of entries holding a copy of each
+    post's pub_date, e.g. a user's TimelineEntry rows or a tag's PostTag rows.
+
+    Pages are keyset reads of the entries on their (owner, -pub_date, -post)
+    index, merged with those of any extra Post querysets, after which only
+    the posts of the page are loaded by id.
+    """
+
+    def __init__(self, posts, entries, extra=()):
+        self.posts = posts
+        self.model = posts.model
+        self.entries = entries.values_list("pub_date", "post_id")
+        self.extra = [queryset.values_list("pub_date", "id") for queryset in extra]
+
+    def seek(self, page_size, position=None, reverse=False):
+        """Return up to page_size + 1 (pub_date, post id) pairs after position"""
+        keys = set(seek(self.entries, page_size, position, reverse, pk_field="post_id"))
+        for queryset in self.extra:
+            keys.update(seek(queryset, page_size, position, reverse))
+        return sorted(keys, reverse=not reverse)[:page_size + 1]
+
+    def newest(self):
+        """Return the (pub_date, id) of the newest post, None when empty"""
+        keys = self.seek(0)
+        return keys[0] if keys else None
+
+    def page(self, page_size, cursor=None):
+        position, reverse = None, False
+        if cursor:
+            pub_date, pk, reverse = decode_cursor(cursor)
+            position = (pub_date, pk)
+        keys = self.seek(page_size, position, reverse)
+        ids = [pk for _, pk in keys[:page_size]]
+        posts = self.posts.in_bulk(ids)
+        rows = [posts[pk] for pk in ids if pk in posts]
+        if reverse:
+            return CursorPage(rows[::-1], True, len(keys) > page_size)
+        return CursorPage(rows, len(keys) > page_size, position is not None)
+
+    def as_queryset(self):
+        """Return the feed's posts as a queryset, for page number pagination"""
+        listed = Q(id__in=self.entries.values("post_id"))
+        for queryset in self.extra:
+            listed |= Q(id__in=queryset.values("id"))
+        return self.posts.filter(listed)
+
+
+def paginate_by_cursor(queryset, page_size, cursor=None):
+    """
+    Return a CursorPage of a queryset ordered newest first by (pub_date, id),
+    or of an EntryFeed.
+
+    Each page is a range read on the (pub_date, id) index which starts from
+    the cursor position, so deep pages cost the same as the first and no
+    COUNT(*) is needed.
+    """
+    if isinstance(queryset, EntryFeed):
+        return queryset.page(page_size, cursor)
+    if not cursor:
+        rows = seek(queryset, page_size)
+        return CursorPage(rows[:page_size], len(rows) > page_size, False)
+
+    pub_date, pk, reverse = decode_cursor(cursor)
+    rows = seek(queryset, page_size, (pub_date, pk), reverse)
+    if reverse:
+        return CursorPage(rows[:page_size][::-1], True, len(rows) > page_size)
+    return CursorPage(rows[:page_size], len(rows) > page_size, True)
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for a ListView of posts.
+
+    Requests carrying the cursor query parameter (an empty value asks for the
+    first page) are paginated by cursor, others fall back to the ListView's
+    page number pagination.
+    """
+    cursor_param = "cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_param not in self.request.GET:
+            if isinstance(queryset, EntryFeed):
+                queryset = queryset.as_queryset()
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = paginate_by_cursor(queryset, page_size, self.request.GET[self.cursor_param])
+        except ValueError as e:
+            raise Http404(str(e))
+        return (None, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,97 @@
+"""
+"Who to follow" suggestions.
+
+A user's candidates are the users followed by the users they follow
+(friends of friends) and the users who liked the same posts as them,
+scored by the number of such paths. rebuild_suggestions() computes them
+with one INSERT ... SELECT per batch of users, letting the database join,
+group and rank (ROW_NUMBER() OVER) the paths instead of looping over users
+in Python, and keeps the best SUGGESTIONS_PER_USER per user.
+"""
+from django.db import connections, transaction
+
+from .models import FollowEdge, FollowSuggestion, Like, User
+
+# Suggestions kept per user
+SUGGESTIONS_PER_USER = 20
+# Score of each followee who follows a candidate
+FOLLOW_WEIGHT = 1.0
+# Score of each post liked by both the user and a candidate
+LIKE_WEIGHT = 0.5
+
+
+def suggestions_sql(connection):
+    """Return the INSERT ... SELECT of the suggestions of an id range of users"""
+    qn = connection.ops.quote_name
+    edge = qn(FollowEdge._meta.db_table)
+    like = qn(Like._meta.db_table)
+    suggestion = qn(FollowSuggestion._meta.db_table)
+    return f"""
+        INSERT INTO {suggestion} (user_id, candidate_id, score, mutuals)
+        SELECT user_id, candidate_id, score, mutuals FROM (
+            SELECT user_id, candidate_id, SUM(weight) AS score, SUM(mutual) AS mutuals,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY user_id ORDER BY SUM(weight) DESC, candidate_id
+                   ) AS position
+            FROM (
+                SELECT mine.follower_id AS user_id, theirs.followee_id AS candidate_id,
+                       %s AS weight, 1 AS mutual
+                FROM {edge} mine
+                JOIN {edge} theirs ON theirs.follower_id = mine.followee_id
+                WHERE mine.follower_id BETWEEN %s AND %s
+                UNION ALL
+                SELECT mine.user_id, theirs.user_id, %s, 0
+                FROM {like} mine
+                JOIN {like} theirs ON theirs.post_id = mine.post_id AND theirs.like_unlike = %s
+                WHERE mine.user_id BETWEEN %s AND %s AND mine.like_unlike = %s
+            ) paths
+            WHERE candidate_id <> user_id AND NOT EXISTS (
+                SELECT 1 FROM {edge} followed
+                WHERE followed.follower_id = paths.user_id AND followed.followee_id = paths.candidate_id
+            )
+            GROUP BY user_id, candidate_id
+        ) ranked
+        WHERE position <= %s
+    """
+
+
+def rebuild_batch(first, last, using="default"):
+    """Replace the suggestions of the users with ids from first to last"""
+    connection = connections[using]
+    params = [
+        FOLLOW_WEIGHT, first, last,
+        LIKE_WEIGHT, True, first, last, True,
+        SUGGESTIONS_PER_USER,
+    ]
+    with transaction.atomic(using=using):
+        FollowSuggestion.objects.using(using).filter(user_id__gte=first, user_id__lte=last).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(suggestions_sql(connection), params)
+
+
+def rebuild_suggestions(batch_size=1000, using="default"):
+    """
+    Recompute every user's suggestions, batch_size users per statement, and
+    yield the (first, last) user ids of each batch once done
+    """
+    last = 0
+    while True:
+        ids = list(
+            User.objects.using(using).filter(id__gt=last).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        first, last = ids[0], ids[-1]
+        rebuild_batch(first, last, using)
+        yield first, last
+
+
+def suggestions_for(user, limit=5):
+    """Return the best suggested users for user that they don't follow yet"""
+    return [
+        suggestion.candidate
+        for suggestion in FollowSuggestion.objects.filter(user=user)
+        .exclude(candidate__follower_edges__follower=user)
+        .select_related("candidate")
+        .order_by("-score", "candidate_id")[:limit]
+    ]
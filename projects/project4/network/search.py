@@ -0,0 +1,124 @@
+"""
+Full-text search of posts.
+
+On SQLite posts are matched against the network_post_fts FTS5 index (see
+migrations/_fts.py) and ranked by bm25, so a search reads the posting lists
+of its terms instead of scanning every post. Other databases fall back to
+an icontains filter per term, newest first, with snippets cut in Python.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+# Most terms of a query that are searched for
+MAX_TERMS = 10
+# Tokens of context shown around matches in a snippet
+SNIPPET_TOKENS = 16
+SNIPPET_CHARS = 120
+
+# Match markers which can't appear in escaped post content
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+def parse_terms(query):
+    """Return the word terms of a search query"""
+    return re.findall(r"\w+", query)[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """Return an FTS5 query matching posts holding every term, the last as a prefix"""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def highlight(snippet):
+    """Return a snippet as HTML with its matches wrapped in <mark>"""
+    html = escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+    return mark_safe(html)
+
+
+def cut_snippet(content, terms):
+    """Return the part of content around the first term, with terms marked"""
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    match = pattern.search(content)
+    start = max(match.start() - SNIPPET_CHARS // 2, 0) if match else 0
+    snippet = content[start:start + SNIPPET_CHARS]
+    snippet = pattern.sub(lambda m: f"{MARK_START}{m.group()}{MARK_END}", snippet)
+    return ("…" if start else "") + snippet + ("…" if start + SNIPPET_CHARS < len(content) else "")
+
+
+class PostSearch:
+    """
+    Lazy search results for a query, sliced and counted like a queryset so
+    they can be handed to a Paginator. Each post gets a highlighted snippet.
+    """
+
+    def __init__(self, query, viewer):
+        self.terms = parse_terms(query)
+        self.viewer = viewer
+        self.connection = connections[Post.objects.db]
+        self._count = None
+
+    @property
+    def uses_fts(self):
+        return self.connection.vendor == "sqlite"
+
+    def fallback_queryset(self):
+        match = Q()
+        for term in self.terms:
+            match &= Q(content__icontains=term)
+        return Post.objects.for_viewer(self.viewer).filter(match)
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if self._count is None:
+            if self.uses_fts:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT count(*) FROM network_post_fts WHERE network_post_fts MATCH %s",
+                        [match_expression(self.terms)],
+                    )
+                    self._count = cursor.fetchone()[0]
+            else:
+                self._count = self.fallback_queryset().count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("PostSearch only supports slicing")
+        offset, stop = key.start or 0, key.stop
+        if not self.terms or (stop is not None and stop <= offset):
+            return []
+        if not self.uses_fts:
+            posts = list(self.fallback_queryset()[offset:stop])
+            for post in posts:
+                post.snippet = highlight(cut_snippet(post.content, self.terms))
+            return posts
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid, snippet(network_post_fts, 0, %s, %s, '…', %s) "
+                "FROM network_post_fts WHERE network_post_fts MATCH %s "
+                "ORDER BY rank, rowid DESC LIMIT %s OFFSET %s",
+                [MARK_START, MARK_END, SNIPPET_TOKENS, match_expression(self.terms),
+                 -1 if stop is None else stop - offset, offset],
+            )
+            snippets = dict(cursor.fetchall())
+        found = Post.objects.for_viewer(self.viewer).in_bulk(list(snippets))
+        posts = []
+        for post_id, snippet in snippets.items():
+            if post_id in found:
+                post = found[post_id]
+                post.snippet = highlight(snippet)
+                posts.append(post)
+        return posts
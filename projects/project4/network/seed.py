@@ -0,0 +1,233 @@
+"""
+Synthetic users, posts, likes and follows, see the seed_network and
+bench_network commands.
+
+Rows are generated in chunks with explicit ids, so nothing is read back
+and memory stays flat, and written with bulk_create bypassing the counter
+keeping querysets. Inside bulk_load() SQLite is tuned for the load and
+the non-unique indexes and full-text triggers are only rebuilt once the
+raw rows are in. The data the model signals would derive (like/follow
+counters, timelines, hashtag and full-text indexes) is then rebuilt with
+set-based queries.
+
+Uniqueness holds by construction, so the "unique like" and "unique follow
+list" constraints (still enforced during the load) are never hit: every
+user gets one Follow, and each user's likes and followees are sampled
+without replacement.
+"""
+import random
+import sqlite3
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from . import tags, timeline
+from .migrations import _fts
+from .models import Follow, FollowEdge, Like, Post, User
+
+WORDS = (
+    "the a an and or but cs50 django python web network post like follow "
+    "today tomorrow great new old coffee code bug fix ship test review "
+    "morning evening weekend music film book run walk team idea"
+).split()
+HASHTAGS = ["cs50", "django", "python", "coffee", "weekend"]
+# Spread of the synthetic posts' pub_date
+POST_SPAN = timedelta(days=30)
+# Rows generated and written per transaction
+CHUNK_SIZE = 50000
+# Rows per INSERT, SQLite's default SQLITE_MAX_COMPOUND_SELECT as Django
+# writes the rows as a compound SELECT there. Reaching it needs more bound
+# parameters than Django's default limit of 999, see bulk_load
+ROWS_PER_INSERT = 500
+# Tables bulk loaded, whose non-unique indexes are dropped during the load
+LOADED_MODELS = [User, Post, Like, Follow, FollowEdge]
+# Page cache used for a load, in KiB
+CACHE_SIZE_KIB = 256 * 1024
+
+
+def synthetic_content(rng):
+    """Return a random post content, sometimes with a hashtag"""
+    words = rng.choices(WORDS, k=rng.randint(3, 20))
+    if rng.random() < 0.2:
+        words.append(f"#{rng.choice(HASHTAGS)}")
+    return " ".join(words)[:160]
+
+
+def spread(total, buckets):
+    """Yield how many of total fall in each bucket, as evenly as possible"""
+    share, extra = divmod(total, buckets)
+    for i in range(buckets):
+        yield share + (i < extra)
+
+
+def next_id(model, using):
+    return (model.objects.using(using).aggregate(top=models.Max("id"))["top"] or 0) + 1
+
+
+def write(model, rows, using):
+    """
+    Insert rows with the plain bulk_create, ROWS_PER_INSERT rows per
+    statement and one transaction per chunk
+    """
+    manager = models.QuerySet(model, using=using)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            with transaction.atomic(using=using):
+                manager.bulk_create(chunk, batch_size=ROWS_PER_INSERT)
+            chunk = []
+    if chunk:
+        with transaction.atomic(using=using):
+            manager.bulk_create(chunk, batch_size=ROWS_PER_INSERT)
+
+
+@contextmanager
+def deferred_indexes(using="default"):
+    """Drop the non-unique indexes of the loaded tables, recreating them on exit"""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        yield
+        return
+    tables = [model._meta.db_table for model in LOADED_MODELS]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND sql NOT LIKE 'CREATE UNIQUE%%' AND tbl_name IN ({', '.join(['%s'] * len(tables))})",
+            tables,
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+@contextmanager
+def bulk_load(using="default"):
+    """
+    Tune the database for a large load: on SQLite, no fsync and an in-memory
+    journal and temp store, a larger page cache and up to ROWS_PER_INSERT
+    rows per INSERT. Full-text triggers are dropped for the load and the
+    index rebuilt in one pass on exit. The pragmas can't change inside a
+    transaction, they're left alone then (e.g. in tests).
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        yield
+        return
+    connection.ensure_connection()
+    features = connection.features
+    max_query_params = features.max_query_params
+    if sqlite3.sqlite_version_info >= (3, 32):
+        features.max_query_params = 32766
+    pragmas = {}
+    with connection.cursor() as cursor:
+        if not connection.in_atomic_block:
+            for pragma, value in [("synchronous", "OFF"), ("journal_mode", "MEMORY"),
+                                  ("temp_store", "MEMORY"), ("cache_size", -CACHE_SIZE_KIB)]:
+                cursor.execute(f"PRAGMA {pragma}")
+                pragmas[pragma] = cursor.fetchone()[0]
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+        for name in _fts.TRIGGER_NAMES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        yield
+    finally:
+        features.max_query_params = max_query_params
+        with connection.cursor() as cursor:
+            for sql in _fts.TRIGGERS_SQL:
+                cursor.execute(sql)
+            cursor.execute(_fts.REBUILD_SQL)
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+            cursor.execute("ANALYZE")
+
+
+def generate(users=1000, posts=10000, likes=50000, follows=20000, seed=0, prefix="bench",
+             using="default", progress=lambda message: None):
+    """
+    Create users named <prefix>-<n> with posts, likes and follows between
+    them and return the number of rows of each created
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    # Hashing is the slow part of create_user, every user shares one hash
+    password = make_password("password")
+    users = max(users, 1)
+    first_user, first_post = next_id(User, using), next_id(Post, using)
+    first_follow, first_edge = next_id(Follow, using), next_id(FollowEdge, using)
+    user_ids = range(first_user, first_user + users)
+    post_ids = range(first_post, first_post + posts)
+    # Creator of each post, by offset from first_post
+    creators = array("q", (rng.choice(user_ids) for _ in post_ids))
+    totals = {"users": users, "posts": posts, "likes": 0, "follows": 0}
+
+    def like_rows():
+        for user_id, wanted in zip(user_ids, spread(likes, users)):
+            for offset in rng.sample(range(posts), min(wanted, posts)):
+                # Users can't like their own posts, see Like.clean
+                if creators[offset] != user_id:
+                    totals["likes"] += 1
+                    yield Like(user_id=user_id, post_id=first_post + offset, like_unlike=rng.random() < 0.8)
+
+    def edge_rows():
+        edge_id = first_edge
+        for index, wanted in enumerate(spread(follows, users)):
+            follower = user_ids[index]
+            for offset in rng.sample(range(users - 1), min(wanted, users - 1)):
+                # Skip over the follower, nobody follows themselves
+                followee = user_ids[offset + (offset >= index)]
+                totals["follows"] += 1
+                yield FollowEdge(id=edge_id, follow_id=first_follow + index,
+                                 follower_id=follower, followee_id=followee)
+                edge_id += 1
+
+    with bulk_load(using):
+        with deferred_indexes(using):
+            write(User, (
+                User(id=user_id, username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password)
+                for i, user_id in enumerate(user_ids)
+            ), using)
+            progress(f"{users} users")
+            write(Post, (
+                Post(id=post_id, creator_id=creators[offset], content=synthetic_content(rng),
+                     pub_date=now - POST_SPAN * rng.random())
+                for offset, post_id in enumerate(post_ids)
+            ), using)
+            progress(f"{posts} posts")
+            write(Like, like_rows(), using)
+            progress(f"{totals['likes']} likes")
+            write(Follow, (
+                Follow(id=first_follow + index, user_id=user_id) for index, user_id in enumerate(user_ids)
+            ), using)
+            write(FollowEdge, edge_rows(), using)
+            progress(f"{totals['follows']} follows")
+
+        # Explicit ids don't advance sequences on other databases
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Post, Follow, FollowEdge]):
+                cursor.execute(sql)
+
+        loaded_posts = Post.objects.using(using).filter(id__gte=first_post)
+        loaded_posts.recount()
+        FollowEdge.objects.using(using).recount(User.objects.using(using).filter(id__gte=first_user).values("id"))
+        progress("counters")
+        timeline.rebuild(user_ids, using)
+        progress("timelines")
+        loaded_posts = loaded_posts.order_by("id").only("id", "content", "pub_date")
+        for start in range(first_post, first_post + posts, CHUNK_SIZE):
+            tags.index_posts(loaded_posts.filter(id__gte=start, id__lt=start + CHUNK_SIZE), replace=False)
+        progress("hashtags")
+
+    return totals
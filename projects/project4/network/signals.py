@@ -1,13 +1,134 @@
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
 
-def following_changed(sender, action, instance, *args, **kwargs):
+def following_changed(sender, action, instance, reverse, pk_set, **kwargs):
     """Raise an error if admin tries to assign User to the Users follow list"""
 
     # m2mchanged.connect specified in apps.py
+    # Only the ids being added are checked, the existing list is never loaded.
+    # FollowEdge's "cannot follow oneself" constraint backs this up.
+    from .models import Follow
 
-    following = instance.following.all()
-    creator = instance.user
+    if action != "pre_add":
+        return
+    if reverse:
+        # instance is the followed User and pk_set holds Follow ids
+        self_follow = Follow.objects.filter(pk__in=pk_set, user=instance).exists()
+    else:
+        self_follow = instance.user_id in pk_set
 
-    if creator in following:
-        raise ValidationError ("can't like own post")
+    if self_follow:
+        raise ValidationError("User cannot follow themselves")
+
+
+def like_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the Post like/unlike counters in step with a saved Like"""
+
+    # post_save.connect specified in apps.py
+    from .models import Post
+
+    if raw:
+        return
+    previous = getattr(instance, "_loaded_like_unlike", None)
+    if created:
+        Post.adjust_count(instance.post_id, instance.like_unlike, 1)
+    elif previous is not None and previous != instance.like_unlike:
+        Post.adjust_count(instance.post_id, instance.like_unlike, 1)
+        Post.adjust_count(instance.post_id, previous, -1)
+    instance._loaded_like_unlike = instance.like_unlike
+
+
+def like_deleted(sender, instance, **kwargs):
+    """Decrement the Post counter when a Like is deleted, incl. cascades"""
+
+    # post_delete.connect specified in apps.py
+    from .models import Post
+
+    stored = getattr(instance, "_loaded_like_unlike", instance.like_unlike)
+    Post.adjust_count(instance.post_id, stored, -1)
+
+
+def post_created(sender, instance, created, raw=False, **kwargs):
+    """Push a new Post into its creator's followers' timelines"""
+
+    # post_save.connect specified in apps.py
+    from . import timeline
+
+    if created and not raw:
+        timeline.push_post(instance)
+
+
+def post_changed(sender, instance, raw=False, **kwargs):
+    """Bump the feed version on a Post edit or delete, incl. cascades"""
+
+    # post_save/post_delete.connect specified in apps.py
+    from .models import FeedVersion
+
+    if not kwargs.get("created") and not raw:
+        FeedVersion.bump()
+
+
+def post_broadcast(sender, instance, created, raw=False, **kwargs):
+    """Send a new Post to the server-sent events clients once committed"""
+
+    # post_save.connect specified in apps.py
+    from . import events
+
+    if created and not raw:
+        summary = events.post_summary(instance)
+        transaction.on_commit(lambda: events.hub.publish(summary))
+
+
+def post_tags_changed(sender, instance, created, raw=False, **kwargs):
+    """Index the hashtags and mentions of a saved Post"""
+
+    # post_save.connect specified in apps.py
+    from . import tags
+
+    if raw or (created and "#" not in instance.content and "@" not in instance.content):
+        return
+    tags.index_posts([instance], replace=not created)
+
+
+def timeline_following_changed(sender, action, instance, reverse, pk_set, **kwargs):
+    """Backfill or trim the follower's timeline when a follow list changes"""
+
+    # m2m_changed.connect specified in apps.py
+    from . import timeline
+    from .models import Follow
+
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # instance is the followed User and pk_set holds Follow ids
+        if pk_set is None:
+            follower_ids = sender.objects.filter(followee=instance).values_list("follower_id", flat=True)
+        else:
+            follower_ids = Follow.objects.filter(pk__in=pk_set).values_list("user_id", flat=True)
+        pairs = [(follower_id, [instance.pk]) for follower_id in follower_ids]
+    else:
+        pairs = [(instance.user_id, pk_set)]
+
+    for follower_id, followee_ids in pairs:
+        if action == "post_add":
+            timeline.backfill(follower_id, followee_ids)
+        else:
+            timeline.remove(follower_id, followee_ids)
+
+
+def follow_edge_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    """Count a FollowEdge created outside of bulk_create"""
+
+    # post_save.connect specified in apps.py
+
+    if created and not raw:
+        sender.adjust_counts({instance.follower_id: 1}, {instance.followee_id: 1}, using=using)
+
+
+def follow_edge_deleted(sender, instance, using=None, **kwargs):
+    """Uncount a deleted FollowEdge, incl. cascades and m2m remove/clear"""
+
+    # post_delete.connect specified in apps.py
+
+    sender.adjust_counts({instance.follower_id: 1}, {instance.followee_id: 1}, sign=-1, using=using)
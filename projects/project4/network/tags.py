@@ -0,0 +1,53 @@
+"""
+Hashtag and @mention index of posts.
+
+Tags and mentions are parsed out of Post.content when a post is saved and
+stored in PostTag/Mention rows, so the posts for a tag or user are read
+from an index instead of a LIKE '%...%' scan of every post.
+"""
+import re
+
+from django.db import transaction
+
+from .models import Mention, PostTag, User
+
+HASHTAG_RE = re.compile(r"(?<![\w#])#(\w{1,50})")
+# Usernames may hold letters, digits and @/./+/-/_, a trailing "." ends a sentence
+MENTION_RE = re.compile(r"(?<![\w@])@([\w.@+-]{1,150})")
+
+
+def extract_hashtags(text):
+    """Return the distinct lower cased hashtags in text"""
+    return {tag.lower() for tag in HASHTAG_RE.findall(text)}
+
+
+def extract_mentions(text):
+    """Return the distinct usernames mentioned in text"""
+    return {name.rstrip(".") for name in MENTION_RE.findall(text)} - {""}
+
+
+def index_posts(posts, replace=True):
+    """
+    Store the hashtags and mentions of posts, replacing any rows they already
+    have unless replace is False (e.g. for newly created posts)
+    """
+    posts = list(posts)
+    mentioned = {post.id: extract_mentions(post.content) for post in posts}
+    usernames = set().union(*mentioned.values())
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list("username", "id")) if usernames else {}
+
+    tags = [
+        PostTag(post_id=post.id, tag=tag, pub_date=post.pub_date)
+        for post in posts for tag in extract_hashtags(post.content)
+    ]
+    mentions = [
+        Mention(post_id=post.id, user_id=user_ids[name], pub_date=post.pub_date)
+        for post in posts for name in mentioned[post.id] if name in user_ids
+    ]
+    post_ids = [post.id for post in posts]
+    with transaction.atomic():
+        if replace:
+            PostTag.objects.filter(post_id__in=post_ids).delete()
+            Mention.objects.filter(post_id__in=post_ids).delete()
+        PostTag.objects.bulk_create(tags, batch_size=500)
+        Mention.objects.bulk_create(mentions, batch_size=500)
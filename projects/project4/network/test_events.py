@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase, TestCase
+
+from . import events
+from .models import Post, User
+
+
+class EventsAppTestCase(SimpleTestCase):
+
+    def run_client(self, hub, publish):
+        """
+        Connect a client to events_app, call publish once it's subscribed,
+        then disconnect it and return the body chunks it was sent
+        """
+        sent = []
+        disconnect = asyncio.Event()
+
+        async def receive():
+            if not hasattr(receive, "called"):
+                receive.called = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 3:
+                disconnect.set()
+
+        async def main():
+            task = asyncio.ensure_future(events.events_app({"type": "http"}, receive, send, hub=hub))
+            while not hub.queues:
+                await asyncio.sleep(0)
+            publish()
+            await asyncio.wait_for(task, timeout=5)
+
+        asyncio.run(main())
+        self.assertFalse(hub.queues)
+        return sent
+
+    def test_stream_new_post(self):
+        """
+        Verify a published post is streamed as a server-sent event
+        """
+        hub = events.Hub(events.LocalBackend)
+        message = {"id": 7, "creator": "john", "pub_date": "2021-01-01T00:00:00+00:00"}
+        sent = self.run_client(hub, lambda: hub.publish(message))
+
+        self.assertEqual(dict(sent[0]["headers"])[b"content-type"], b"text/event-stream")
+        self.assertEqual(sent[2]["body"], events.format_event(message))
+        self.assertTrue(sent[2]["body"].startswith(b"id: 7\nevent: post\ndata: "))
+
+    def test_publish_from_another_thread(self):
+        """
+        Verify posts published by a sync worker thread reach the client
+        """
+        hub = events.Hub(events.LocalBackend)
+        message = {"id": 8, "creator": "mary", "pub_date": "2021-01-01T00:00:00+00:00"}
+
+        def publish():
+            thread = threading.Thread(target=hub.publish, args=(message,))
+            thread.start()
+            thread.join()
+
+        sent = self.run_client(hub, publish)
+        self.assertEqual(sent[2]["body"], events.format_event(message))
+
+
+class DatabaseBackendTestCase(TestCase):
+
+    def test_fetch_new(self):
+        """
+        Verify polling returns only the posts created since the last poll
+        """
+        john = User.objects.create(username="john")
+        Post.objects.create(creator=john, content="old")
+        backend = events.DatabaseBackend(events.Hub(events.LocalBackend))
+        self.assertEqual(backend.fetch_new(), [])
+        post = Post.objects.create(creator=john, content="new")
+        self.assertEqual([message["id"] for message in backend.fetch_new()], [post.id])
+        self.assertEqual(backend.fetch_new(), [])
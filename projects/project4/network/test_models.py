@@ -1,12 +1,27 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import StringIO
+import os
+import tempfile
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import connection, transaction
+from django.db.models import F
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 import pytz
 from unittest import mock
 
-from .models import Like, Follow, Post, User
+from .models import (
+    Like, Follow, FollowEdge, FollowSuggestion, Mention, Post, PostActivity, PostScore, PostTag, TimelineEntry,
+    TrendingCheckpoint, User,
+)
+from .pagination import paginate_by_cursor
+from .search import PostSearch
+from . import recommendations, seed, tags, timeline, trending
 
 
 class PostTestCase(TestCase):
@@ -53,6 +68,7 @@ class PostTestCase(TestCase):
         for i, user in enumerate(users, start=1):
             with self.subTest(f"Testing likes_count - #{i}"):
                 Like.objects.create(post=post, user=user, like_unlike=True)
+                post.refresh_from_db()
                 likes_count = post.likes_count
                 self.assertEqual(likes_count, i)
 
@@ -65,6 +81,7 @@ class PostTestCase(TestCase):
         for i, user in enumerate(users, start=1):
             with self.subTest(f"Testing unlikes_count - #{i}"):
                 Like.objects.create(post=post, user=user, like_unlike=False)
+                post.refresh_from_db()
                 unlikes_count = post.unlikes_count
                 self.assertEqual(unlikes_count, i)
 
@@ -78,11 +95,13 @@ class PostTestCase(TestCase):
         # Create a like for each user
         for user in users:
             Like.objects.create(post=post, user=user, like_unlike=False)
+        post.refresh_from_db()
         if post.unlikes_count != 3:
             raise Exception("Pre-test error - unlikes_count should equal 3")
         for i, user in enumerate(users, start=1):
             with self.subTest(f"Testing likes_count - #{i}"):
                 Like.objects.filter(post=post, user=user).update(like_unlike=True)
+                post.refresh_from_db()
                 likes_count = post.likes_count
                 unlikes_count = post.unlikes_count
                 self.assertEqual(likes_count, i)
@@ -97,11 +116,13 @@ class PostTestCase(TestCase):
         users = [User.objects.get(id=i) for i in range(2, 5)]
         for user in users:
             Like.objects.create(post=post, user=user, like_unlike=True)
+        post.refresh_from_db()
         if post.likes_count != 3:
             raise Exception("Pre-test error - likes_count should equal 3")
         for i, user in enumerate(users, start=1):
             with self.subTest(f"Testing likes_count - #{i}"):
                 Like.objects.filter(post=post, user=user).delete()
+                post.refresh_from_db()
                 likes_count = post.likes_count
                 self.assertEqual(likes_count, 3 - i)
 
@@ -114,11 +135,13 @@ class PostTestCase(TestCase):
         users = [User.objects.get(id=i) for i in range(2, 5)]
         for user in users:
             Like.objects.create(post=post, user=user, like_unlike=False)
+        post.refresh_from_db()
         if post.unlikes_count != 3:
             raise Exception("Pre-test error - unlikes_count should equal 3")
         for i, user in enumerate(users, start=1):
             with self.subTest(f"Testing likes_count - #{i}"):
                 Like.objects.filter(post=post, user=user).delete()
+                post.refresh_from_db()
                 unlikes_count = post.unlikes_count
                 self.assertEqual(unlikes_count, 3 - i)
 
@@ -176,6 +199,88 @@ class PostTestCase(TestCase):
         self.assertTrue(Post.objects.filter(id=post.id).exists())
 
 
+class LikeCountTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create Users & a Post by the first user"""
+        for name in ["john", "mary", "paddy", "betty"]:
+            User.objects.create(username=name, email=f"{name}@email.com")
+        Post.objects.create(creator=User.objects.get(id=1), content="post-1")
+
+    def setUp(self):
+        self.post = Post.objects.get(id=1)
+        self.users = list(User.objects.exclude(id=1))
+
+    def assertCounts(self, likes, unlikes):
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.unlikes_count), (likes, unlikes))
+
+    def test_flip_like_with_save(self):
+        """
+        Verify saving a Like with a changed like_unlike moves it between counters
+        """
+        Like.objects.create(post=self.post, user=self.users[0], like_unlike=True)
+        like = Like.objects.get(post=self.post, user=self.users[0])
+        like.like_unlike = False
+        like.save()
+        self.assertCounts(0, 1)
+        like.save()
+        self.assertCounts(0, 1)
+
+    def test_bulk_create(self):
+        """
+        Verify bulk created Likes are added to the counters
+        """
+        Like.objects.bulk_create([
+            Like(post=self.post, user=self.users[0], like_unlike=True),
+            Like(post=self.post, user=self.users[1], like_unlike=True),
+            Like(post=self.post, user=self.users[2], like_unlike=False),
+        ])
+        self.assertCounts(2, 1)
+
+    def test_bulk_create_ignore_conflicts(self):
+        """
+        Verify conflicting rows skipped by bulk_create aren't counted
+        """
+        Like.objects.create(post=self.post, user=self.users[0], like_unlike=True)
+        Like.objects.bulk_create([
+            Like(post=self.post, user=self.users[0], like_unlike=False),
+            Like(post=self.post, user=self.users[1], like_unlike=False),
+        ], ignore_conflicts=True)
+        self.assertCounts(1, 1)
+
+    def test_bulk_update_only_counts_flipped_rows(self):
+        """
+        Verify a queryset update doesn't count rows that already had the value
+        """
+        Like.objects.create(post=self.post, user=self.users[0], like_unlike=True)
+        Like.objects.create(post=self.post, user=self.users[1], like_unlike=False)
+        Like.objects.update(like_unlike=True)
+        self.assertCounts(2, 0)
+
+    def test_cascade_delete_user(self):
+        """
+        Verify deleting a User removes their Likes from the counters
+        """
+        Like.objects.create(post=self.post, user=self.users[0], like_unlike=True)
+        Like.objects.create(post=self.post, user=self.users[1], like_unlike=False)
+        self.users[1].delete()
+        self.assertCounts(1, 0)
+
+    def test_reconcile_like_counts(self):
+        """
+        Verify reconcile_like_counts repairs drifted counters
+        """
+        Like.objects.create(post=self.post, user=self.users[0], like_unlike=True)
+        Post.objects.update(likes_count=7, unlikes_count=3)
+        out = StringIO()
+        call_command("reconcile_like_counts", stdout=out)
+        self.assertIn("Reconciled 1 drifted post(s)", out.getvalue())
+        self.assertCounts(1, 0)
+        self.assertFalse(Post.objects.drifted().exists())
+
+
 class LikeTestCase(TestCase):
 
     @classmethod
@@ -406,4 +511,547 @@ class FollowTestCase(TestCase):
         follow = Follow.objects.create(user=user)
         actual = str(follow)
         expected = f"Follow #{follow.id} - {user}'s follows list"
-        self.assertEqual(actual, expected)
\ No newline at end of file
+        self.assertEqual(actual, expected)
+
+class FollowEdgeTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ["john", "mary", "paddy"]:
+            User.objects.create(username=name, email=f"{name}@email.com")
+
+    def setUp(self):
+        self.john, self.mary, self.paddy = User.objects.order_by("id")
+        self.follow = Follow.objects.create(user=self.john)
+
+    def assertCounts(self, user, followers, following):
+        user.refresh_from_db()
+        self.assertEqual((user.followers_count, user.following_count), (followers, following))
+
+    def test_add_creates_edges(self):
+        """
+        Verify adding to a follow list creates edges with the follower filled in
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        edges = FollowEdge.objects.values_list("follower", "followee")
+        self.assertCountEqual(edges, [(self.john.id, self.mary.id), (self.john.id, self.paddy.id)])
+        self.assertCounts(self.john, 0, 2)
+        self.assertCounts(self.mary, 1, 0)
+
+    def test_reverse_add(self):
+        """
+        Verify adding a follow list from the followed user's side is counted
+        """
+        self.mary.following.add(self.follow)
+        self.assertTrue(self.john.follows(self.mary))
+        self.assertCounts(self.john, 0, 1)
+        self.assertCounts(self.mary, 1, 0)
+
+    def test_remove_and_clear(self):
+        """
+        Verify removing and clearing a follow list decrements the counters
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        self.follow.following.remove(self.mary)
+        self.assertCounts(self.john, 0, 1)
+        self.assertCounts(self.mary, 0, 0)
+        self.follow.following.clear()
+        self.assertCounts(self.john, 0, 0)
+        self.assertCounts(self.paddy, 0, 0)
+
+    def test_cascade_delete_user(self):
+        """
+        Verify deleting a followed user decrements the follower's counter
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        self.mary.delete()
+        self.assertCounts(self.john, 0, 1)
+
+    def test_create_edge_directly(self):
+        """
+        Verify an edge created without the m2m manager is filled in and counted
+        """
+        FollowEdge.objects.create(follow=self.follow, followee=self.mary)
+        self.assertTrue(self.john.follows(self.mary))
+        self.assertFalse(self.mary.follows(self.john))
+        self.assertCounts(self.john, 0, 1)
+        self.assertCounts(self.mary, 1, 0)
+
+    def test_recount(self):
+        """
+        Verify recount restores drifted follow counters on the queryset's database
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        User.objects.update(following_count=7, followers_count=7)
+        FollowEdge.objects.using("default").recount(User.objects.values("id"))
+        self.assertCounts(self.john, 0, 2)
+        self.assertCounts(self.mary, 1, 0)
+
+    def test_cannot_follow_oneself_reverse(self):
+        """
+        Verify a user can't add their own follow list from the followed side
+        """
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.john.following.add(self.follow)
+        self.assertFalse(FollowEdge.objects.exists())
+
+    def test_self_follow_check_constraint(self):
+        """
+        Verify the database rejects a self-follow that bypasses the m2m check
+        """
+        with self.assertRaises(IntegrityError):
+            FollowEdge.objects.create(follow=self.follow, followee=self.john)
+
+    def test_self_follow_check_only_loads_added_ids(self):
+        """
+        Verify the self-follow check doesn't query the existing follow list
+        """
+        self.follow.following.add(self.mary)
+        with CaptureQueriesContext(connection) as queries:
+            self.follow.following.add(self.paddy)
+        self.assertFalse([q for q in queries if "INNER JOIN" in q["sql"] and "network_followedge" in q["sql"]])
+
+    def test_unique_edge(self):
+        """
+        Verify a user can't follow the same user twice
+        """
+        FollowEdge.objects.create(follow=self.follow, followee=self.mary)
+        with self.assertRaises(IntegrityError):
+            FollowEdge.objects.create(follow=self.follow, followee=self.mary)
+
+
+class TimelineTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ["john", "mary", "paddy", "betty"]:
+            User.objects.create(username=name, email=f"{name}@email.com")
+
+    def setUp(self):
+        self.john, self.mary, self.paddy, self.betty = User.objects.order_by("id")
+        self.follow = Follow.objects.create(user=self.john)
+
+    def timeline_ids(self, user):
+        return list(TimelineEntry.objects.filter(user=user).values_list("post_id", flat=True))
+
+    def test_new_post_pushed_to_followers(self):
+        """
+        Verify a new post is pushed into its creator's followers' timelines only
+        """
+        self.follow.following.add(self.mary)
+        post = Post.objects.create(creator=self.mary, content="hello")
+        Post.objects.create(creator=self.paddy, content="not followed")
+        self.assertEqual(self.timeline_ids(self.john), [post.id])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """
+        Verify following copies existing posts in, and unfollowing removes them
+        """
+        posts = [Post.objects.create(creator=self.mary, content=f"post-{i}") for i in range(3)]
+        self.follow.following.add(self.mary)
+        self.assertCountEqual(self.timeline_ids(self.john), [post.id for post in posts])
+        self.follow.following.remove(self.mary)
+        self.assertEqual(self.timeline_ids(self.john), [])
+
+    def test_backfill_newest_across_followees(self):
+        """
+        Verify a follow backfills the newest posts across all the followees
+        in the same number of queries for one or several of them
+        """
+        start = timezone.now()
+        posts = [Post.objects.create(creator=[self.mary, self.paddy, self.betty][i % 3], content=f"post-{i}",
+                                     pub_date=start + timedelta(minutes=i))
+                 for i in range(6)]
+        with override_settings(NETWORK_TIMELINE_DEPTH=4):
+            with CaptureQueriesContext(connection) as one:
+                timeline.backfill(self.paddy.id, [self.mary.id])
+            with CaptureQueriesContext(connection) as several:
+                timeline.backfill(self.john.id, [self.mary.id, self.paddy.id, self.betty.id])
+        self.assertEqual(len(one), len(several))
+        self.assertCountEqual(self.timeline_ids(self.john), [post.id for post in posts[2:]])
+
+    def test_clear_following(self):
+        """
+        Verify clearing a follow list empties the timeline
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        Post.objects.create(creator=self.paddy, content="hello")
+        self.follow.following.clear()
+        self.assertEqual(self.timeline_ids(self.john), [])
+
+    def test_prune_to_depth(self):
+        """
+        Verify a timeline is trimmed back to its depth once it outgrows the slack
+        """
+        self.follow.following.add(self.mary)
+        with override_settings(NETWORK_TIMELINE_DEPTH=3):
+            start = timezone.now()
+            posts = [Post.objects.create(creator=self.mary, content=f"post-{i}",
+                                         pub_date=start + timedelta(minutes=i))
+                     for i in range(5)]
+        self.assertEqual(self.timeline_ids(self.john), [post.id for post in posts[:1:-1]])
+
+    def test_prune_probes_overfull_timelines(self):
+        """
+        Verify only timelines past their depth plus slack are trimmed, each
+        checked by a single probe rather than a count
+        """
+        start = timezone.now()
+        posts = [Post.objects.create(creator=self.mary, content=f"post-{i}",
+                                     pub_date=start + timedelta(minutes=i))
+                 for i in range(5)]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=self.john, post=post, pub_date=post.pub_date) for post in posts[1:]]
+            + [TimelineEntry(user=self.betty, post=post, pub_date=post.pub_date) for post in posts]
+        )
+        # probe john, probe betty, oldest kept and delete of betty
+        with override_settings(NETWORK_TIMELINE_DEPTH=3), self.assertNumQueries(4):
+            timeline.prune([self.john.id, self.betty.id])
+        self.assertEqual(len(self.timeline_ids(self.john)), 4)
+        self.assertCountEqual(self.timeline_ids(self.betty), [post.id for post in posts[2:]])
+
+    def test_push_prunes_a_sample(self):
+        """
+        Verify a push probes about one in slack of the recipients' timelines
+        """
+        Follow.objects.create(user=self.betty).following.add(self.mary)
+        self.follow.following.add(self.mary)
+        with override_settings(NETWORK_TIMELINE_DEPTH=20), \
+                mock.patch("network.timeline.random.random", side_effect=[0.4, 0.6]), \
+                mock.patch("network.timeline.prune") as prune:
+            Post.objects.create(creator=self.mary, content="hello")
+        first, second = timeline.follower_ids(self.mary.id)
+        prune.assert_called_once_with([first])
+
+    def test_large_accounts_pulled_on_read(self):
+        """
+        Verify posts by accounts over the fan-out limit are read on demand
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        Follow.objects.create(user=self.betty).following.add(self.mary)
+        with override_settings(NETWORK_TIMELINE_FANOUT_LIMIT=1):
+            pulled = Post.objects.create(creator=self.mary, content="pulled")
+            pushed = Post.objects.create(creator=self.paddy, content="pushed")
+            self.assertEqual(self.timeline_ids(self.john), [pushed.id])
+            self.assertEqual(list(paginate_by_cursor(timeline.following_posts(self.john), 10)), [pushed, pulled])
+
+    def test_pages_merge_pushed_and_pulled(self):
+        """
+        Verify cursor pages interleave pushed and pulled posts by date, both ways
+        """
+        self.follow.following.add(self.mary, self.paddy)
+        Follow.objects.create(user=self.betty).following.add(self.mary)
+        start = timezone.now()
+        with override_settings(NETWORK_TIMELINE_FANOUT_LIMIT=1):
+            posts = [Post.objects.create(creator=[self.mary, self.paddy][i % 2], content=f"post-{i}",
+                                         pub_date=start + timedelta(minutes=i // 2))
+                     for i in range(7)]
+            feed = timeline.following_posts(self.john)
+            first = paginate_by_cursor(feed, 3)
+            second = paginate_by_cursor(feed, 3, first.next_cursor)
+            third = paginate_by_cursor(feed, 3, second.next_cursor)
+            back = paginate_by_cursor(feed, 3, third.previous_cursor)
+        newest_first = sorted(posts, key=lambda post: (post.pub_date, post.id), reverse=True)
+        self.assertEqual([list(first), list(second), list(third)],
+                         [newest_first[:3], newest_first[3:6], newest_first[6:]])
+        self.assertEqual((third.has_next(), third.has_previous()), (False, True))
+        self.assertEqual(list(back), newest_first[3:6])
+        self.assertTrue(back.has_previous())
+
+    def test_timeline_read_from_index(self):
+        """
+        Verify a following page is a range read of timeline_user_idx, then posts by id
+        """
+        self.follow.following.add(self.mary)
+        for i in range(3):
+            Post.objects.create(creator=self.mary, content=f"post-{i}")
+        feed = timeline.following_posts(self.john)
+        first = paginate_by_cursor(feed, 2)
+        with CaptureQueriesContext(connection) as queries:
+            paginate_by_cursor(feed, 2, first.next_cursor)
+        self.assertEqual(len(queries), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + queries[0]["sql"].replace("%", "%%"))
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("INDEX timeline_user_idx (user_id=? AND pub_date<?)", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertNotIn("network_post", queries[0]["sql"])
+
+
+class TagIndexTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = User.objects.create(username="john")
+        cls.mary = User.objects.create(username="mary.k")
+
+    def post_tags(self, post):
+        return sorted(PostTag.objects.filter(post=post).values_list("tag", flat=True))
+
+    def post_mentions(self, post):
+        return sorted(Mention.objects.filter(post=post).values_list("user__username", flat=True))
+
+    def test_extract(self):
+        """
+        Verify hashtags are lower cased and emails/anchors aren't taken as tags or mentions
+        """
+        text = "#Django and #django, ##no #ok. mail john@email.com or @mary.k. and @john!"
+        self.assertEqual(tags.extract_hashtags(text), {"django", "ok"})
+        self.assertEqual(tags.extract_mentions(text), {"mary.k", "john"})
+
+    def test_saving_post_indexes_it(self):
+        """
+        Verify a new post gets its tags and mentions of existing users indexed
+        """
+        post = Post.objects.create(creator=self.john, content="#Hello @mary.k and @nobody")
+        self.assertEqual(self.post_tags(post), ["hello"])
+        self.assertEqual(self.post_mentions(post), ["mary.k"])
+
+    def test_editing_post_replaces_index(self):
+        """
+        Verify editing a post replaces its tags and mentions
+        """
+        post = Post.objects.create(creator=self.john, content="#one @mary.k")
+        post.content = "#two @john"
+        post.save()
+        self.assertEqual(self.post_tags(post), ["two"])
+        self.assertEqual(self.post_mentions(post), ["john"])
+
+    def test_reindex_command(self):
+        """
+        Verify the reindex command rebuilds the index in batches and resumes from its checkpoint
+        """
+        posts = [Post.objects.create(creator=self.john, content=f"#tag{i}") for i in range(3)]
+        PostTag.objects.all().delete()
+        checkpoint = self.checkpoint_path()
+        with open(checkpoint, "w") as f:
+            f.write(str(posts[0].id))
+
+        out = StringIO()
+        call_command("reindex_post_tags", batch_size=1, checkpoint=checkpoint, stdout=out)
+        self.assertIn("Reindexed 2 post(s)", out.getvalue())
+        self.assertEqual(sorted(PostTag.objects.values_list("tag", flat=True)), ["tag1", "tag2"])
+
+        call_command("reindex_post_tags", checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(PostTag.objects.count(), 3)
+
+    def checkpoint_path(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return os.path.join(directory.name, "checkpoint")
+
+
+class TrendingTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = User.objects.create(username="john")
+        cls.users = [User.objects.create(username=f"user-{i}") for i in range(3)]
+        cls.posts = [Post.objects.create(creator=cls.john, content=f"post-{i}") for i in range(3)]
+
+    def scores(self):
+        return dict(PostScore.objects.values_list("post_id", "score"))
+
+    def test_likes_fold_into_scores(self):
+        """
+        Verify likes add to and unlikes take away from scores, and folded activity is deleted
+        """
+        first, second, third = self.posts
+        for user in self.users:
+            Like.objects.create(user=user, post=second, like_unlike=True)
+        Like.objects.create(user=self.users[0], post=first, like_unlike=True)
+        Like.objects.create(user=self.users[0], post=third, like_unlike=False)
+        self.assertEqual(trending.update_scores(), 5)
+
+        self.assertFalse(PostActivity.objects.exists())
+        self.assertEqual(list(trending.trending_posts(self.john)), [second, first])
+        self.assertLess(self.scores()[third.id], 0)
+
+    def test_only_new_activity_processed(self):
+        """
+        Verify a run only reads the activity logged since the last checkpoint
+        """
+        Like.objects.create(user=self.users[0], post=self.posts[0], like_unlike=True)
+        trending.update_scores()
+        self.assertEqual(trending.update_scores(), 0)
+        checkpoint = TrendingCheckpoint.objects.get()
+        Like.objects.filter(post=self.posts[0]).update(like_unlike=False)
+        self.assertEqual(trending.update_scores(batch_size=1), 2)
+        self.assertGreater(TrendingCheckpoint.objects.get().last_activity_id, checkpoint.last_activity_id)
+        self.assertAlmostEqual(self.scores()[self.posts[0].id], -1, places=3)
+
+    def test_late_activity_folded(self):
+        """
+        Verify activity committed below the checkpoint is still folded, and once
+        """
+        Like.objects.create(user=self.users[0], post=self.posts[0], like_unlike=True)
+        Like.objects.create(user=self.users[1], post=self.posts[1], like_unlike=True)
+        late = PostActivity.objects.order_by("id").first()
+        late.delete()
+        trending.update_scores()
+        # Committed after a higher id was folded
+        PostActivity.objects.create(id=late.id, post_id=late.post_id, likes=1, unlikes=0)
+        self.assertEqual(trending.update_scores(), 1)
+        self.assertFalse(PostActivity.objects.exists())
+        self.assertEqual(trending.update_scores(), 0)
+        self.assertAlmostEqual(self.scores()[late.post_id], 1, places=3)
+
+    def test_recent_likes_outweigh_older(self):
+        """
+        Verify a like is worth half as much after one half-life
+        """
+        now = timezone.now()
+        PostActivity.objects.bulk_create([
+            PostActivity(post=self.posts[0], likes=1, created=now - trending.TRENDING_HALF_LIFE),
+            PostActivity(post=self.posts[1], likes=1, created=now),
+        ])
+        trending.update_scores(now=now)
+        scores = self.scores()
+        self.assertAlmostEqual(scores[self.posts[0].id] / scores[self.posts[1].id], 0.5)
+
+    def test_rebase_and_prune(self):
+        """
+        Verify moving the epoch keeps the scores' ratios and decayed scores are dropped
+        """
+        now = timezone.now()
+        PostActivity.objects.bulk_create([
+            PostActivity(post=self.posts[0], likes=1, created=now),
+            PostActivity(post=self.posts[1], likes=2, created=now),
+        ])
+        trending.update_scores(now=now)
+        later = now + trending.TRENDING_HALF_LIFE * (trending.REBASE_AFTER + 1)
+        PostActivity.objects.create(post=self.posts[2], likes=1, created=later)
+        trending.update_scores(now=later)
+
+        self.assertEqual(TrendingCheckpoint.objects.get().epoch, later)
+        self.assertEqual(self.scores(), {self.posts[2].id: 1})
+
+    def test_deleted_post_skipped(self):
+        """
+        Verify activity of a deleted post is folded without creating a score
+        """
+        Like.objects.create(user=self.users[0], post=self.posts[0], like_unlike=True)
+        self.posts[0].delete()
+        self.assertEqual(trending.update_scores(), 2)
+        self.assertEqual(self.scores(), {})
+
+
+class RecommendationsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ["john", "mary", "paddy", "betty", "sean"]:
+            User.objects.create(username=name)
+
+    def setUp(self):
+        self.john, self.mary, self.paddy, self.betty, self.sean = User.objects.order_by("id")
+
+    def follow(self, user, *others):
+        follow, _ = Follow.objects.get_or_create(user=user)
+        follow.following.add(*others)
+
+    def rebuild(self, batch_size=1000):
+        return list(recommendations.rebuild_suggestions(batch_size=batch_size))
+
+    def test_friends_of_friends_ranked(self):
+        """
+        Verify users followed by more of one's followees rank first, followed users excluded
+        """
+        self.follow(self.john, self.mary, self.paddy)
+        self.follow(self.mary, self.betty, self.sean, self.paddy, self.john)
+        self.follow(self.paddy, self.betty)
+        self.rebuild(batch_size=2)
+
+        suggestions = FollowSuggestion.objects.filter(user=self.john).order_by("-score")
+        self.assertEqual([(s.candidate, s.mutuals) for s in suggestions], [(self.betty, 2), (self.sean, 1)])
+        self.assertEqual(recommendations.suggestions_for(self.john), [self.betty, self.sean])
+
+    def test_like_co_engagement(self):
+        """
+        Verify users liking the same posts are suggested
+        """
+        post = Post.objects.create(creator=self.sean, content="hello")
+        Like.objects.create(user=self.john, post=post, like_unlike=True)
+        Like.objects.create(user=self.mary, post=post, like_unlike=True)
+        Like.objects.create(user=self.paddy, post=post, like_unlike=False)
+        self.rebuild()
+        self.assertEqual(recommendations.suggestions_for(self.john), [self.mary])
+
+    def test_bounded_and_replaced(self):
+        """
+        Verify each user keeps at most SUGGESTIONS_PER_USER, replaced on rebuild
+        """
+        self.follow(self.john, self.mary)
+        self.follow(self.mary, self.paddy, self.betty, self.sean)
+        with mock.patch.object(recommendations, "SUGGESTIONS_PER_USER", 2):
+            self.rebuild()
+        self.assertEqual(FollowSuggestion.objects.filter(user=self.john).count(), 2)
+        self.follow(self.john, self.paddy, self.betty, self.sean)
+        self.assertEqual(recommendations.suggestions_for(self.john), [])
+        self.rebuild()
+        self.assertFalse(FollowSuggestion.objects.filter(user=self.john).exists())
+
+    def test_command(self):
+        """
+        Verify the command builds the suggestions in batches
+        """
+        self.follow(self.john, self.mary)
+        self.follow(self.mary, self.paddy)
+        out = StringIO()
+        call_command("build_follow_suggestions", batch_size=2, stdout=out)
+        self.assertIn("Built suggestions in 3 batch(es)", out.getvalue())
+        self.assertEqual(recommendations.suggestions_for(self.john), [self.paddy])
+
+
+class SeedTestCase(TestCase):
+
+    def test_generate(self):
+        """
+        Verify synthetic data respects the constraints and keeps derived data in step
+        """
+        with mock.patch.object(seed, "CHUNK_SIZE", 30):
+            volumes = seed.generate(users=20, posts=100, likes=300, follows=80)
+        self.assertEqual(volumes["users"], 20)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Like.objects.count(), volumes["likes"])
+        self.assertEqual(FollowEdge.objects.count(), volumes["follows"])
+        self.assertFalse(Like.objects.filter(user=F("post__creator")).exists())
+        self.assertFalse(Post.objects.drifted().exists())
+
+        user = User.objects.order_by("-following_count").first()
+        self.assertEqual(user.following_count, FollowEdge.objects.filter(follower=user).count())
+        self.assertEqual(
+            set(timeline.following_posts(user).as_queryset().values_list("id", flat=True)),
+            set(Post.objects.filter(creator__follower_edges__follower=user).values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            PostTag.objects.count(),
+            sum(len(tags.extract_hashtags(content)) for content in Post.objects.values_list("content", flat=True)),
+        )
+
+    def test_indexes_and_search_restored(self):
+        """
+        Verify deferred indexes and full-text triggers are back after a load
+        """
+        def indexes():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")
+                return sorted(row[0] for row in cursor.fetchall())
+
+        before = indexes()
+        seed.generate(users=5, posts=20, likes=30, follows=10)
+        self.assertEqual(indexes(), before)
+        post = Post.objects.create(creator=User.objects.first(), content="zebra crossing")
+        self.assertEqual([found.id for found in PostSearch("zebra", AnonymousUser())[:10]], [post.id])
+
+    def test_seed_command(self):
+        """
+        Verify the command seeds the requested volumes and refuses a used prefix
+        """
+        out = StringIO()
+        call_command("seed_network", users=10, posts=30, likes=40, follows=20, stdout=out)
+        self.assertIn("Created 10 users, 30 posts", out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith="seed-").count(), 10)
+        self.assertEqual(FollowEdge.objects.count(), 20)
+        with self.assertRaises(CommandError):
+            call_command("seed_network", users=1, stdout=StringIO())
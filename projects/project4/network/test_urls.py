@@ -17,6 +17,17 @@ class UrlsTestCase(TestCase):
             "/register",
             "/following",
             "/edit",
+            "/trending",
+            "/search",
+            "/likes/bulk",
+            "/api/posts",
+            "/api/posts/following",
+            "/api/posts/tag/test",
+            "/api/posts/mention/test",
+            "/api/posts/test",
+            "/async/",
+            "/async/following",
+            "/async/test",
             "/profile"
         )
         cls.no_of_urls = len(cls.url_paths)
@@ -42,13 +53,24 @@ class UrlsTestCase(TestCase):
             views.RegisterView,
             views.FollowingView,
             views.EditView,
+            views.TrendingView,
+            views.SearchView,
+            views.BulkLikeView,
+            views.PostFeedAPIView,
+            views.PostFeedAPIView,
+            views.PostFeedAPIView,
+            views.PostFeedAPIView,
+            views.PostFeedAPIView,
+            views.index_async,
+            views.following_async,
+            views.profile_async,
             views.ProfileView,
         )
 
         for url_path, expected in zip(self.url_paths, expected_functions):
             with self.subTest(i=url_path):
                 resolver = resolve(url_path)
-                view_function = resolver.func.view_class
+                view_function = getattr(resolver.func, "view_class", resolver.func)
                 self.assertEqual(view_function, expected)
 
     def test_url_view_names(self):
@@ -62,6 +84,17 @@ class UrlsTestCase(TestCase):
             "register",
             "following",
             "edit",
+            "trending",
+            "search",
+            "bulk_like",
+            "api_posts",
+            "api_following",
+            "api_tag",
+            "api_mention",
+            "api_profile",
+            "index_async",
+            "following_async",
+            "profile_async",
             "profile",
         )
 
@@ -83,6 +116,17 @@ class UrlsTestCase(TestCase):
             ('register', {}, '/register'),
             ('following', {}, '/following'),
             ('edit', {}, '/edit'),
+            ('trending', {}, '/trending'),
+            ('search', {}, '/search'),
+            ('bulk_like', {}, '/likes/bulk'),
+            ('api_posts', {}, '/api/posts'),
+            ('api_following', {}, '/api/posts/following'),
+            ('api_tag', {'tag': 'test'}, '/api/posts/tag/test'),
+            ('api_mention', {'username': 'test'}, '/api/posts/mention/test'),
+            ('api_profile', {'profile_name': 'test'}, '/api/posts/test'),
+            ('index_async', {}, '/async/'),
+            ('following_async', {}, '/async/following'),
+            ('profile_async', {'profile_name': 'test'}, '/async/test'),
             ('profile', {'profile_name': 'test'}, '/test'),
         )
 
@@ -1,9 +1,15 @@
+import json
+from datetime import timedelta
+from django.db import connection
 from django.test import Client, RequestFactory,TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from unittest import mock
 
 from .models import Follow, Like, Post, User
-from . import views
+from .search import PostSearch
+from . import trending, views
 # from .views import index, login_view, logout_view, register, profile, edit, following
 
 
@@ -47,6 +53,77 @@ class ViewsTestCase(TestCase):
                 self.assertEqual(response.status_code, 200)
                 self.assertTemplateUsed(response, root_folder + expected)
 
+    def test_index_query_count_independent_of_posts(self):
+        """
+        Verify the index feed costs the same number of queries for 1 or 10 posts
+        """
+        for i in range(10):
+            user = User.objects.create(username=f"user-{i}")
+            Post.objects.create(creator=user, content=f"post-{i}")
+        Like.objects.create(post=Post.objects.last(), user=user, like_unlike=True)
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/")
+        self.assertEqual(len(response.context["post_list"]), 10)
+
+        Post.objects.exclude(id=Post.objects.first().id).delete()
+        with self.assertNumQueries(2):
+            self.client.get("/")
+
+    def test_feed_viewer_reaction_constant_queries(self):
+        """
+        Verify the logged in feed shows the viewer's reactions in constant queries
+        """
+        viewer = User.objects.create(username="viewer")
+        posts = []
+        for i in range(10):
+            user = User.objects.create(username=f"user-{i}")
+            posts.append(Post.objects.create(creator=user, content=f"post-{i}"))
+        Like.objects.create(post=posts[0], user=viewer, like_unlike=True)
+        Like.objects.create(post=posts[1], user=viewer, like_unlike=False)
+        self.client.force_login(viewer)
+
+        # session, viewer, count, posts
+        with self.assertNumQueries(4):
+            response = self.client.get("/")
+        reactions = {post.id: post.viewer_reaction for post in response.context["post_list"]}
+        self.assertIs(reactions[posts[0].id], True)
+        self.assertIs(reactions[posts[1].id], False)
+        self.assertIsNone(reactions[posts[2].id])
+        self.assertContains(response, "You like this", count=1)
+
+        Post.objects.filter(id__in=[post.id for post in posts[2:]]).delete()
+        with self.assertNumQueries(4):
+            self.client.get("/")
+
+    def test_following_page_lists_followed_posts(self):
+        """
+        Verify the following page shows the posts of followed users
+        """
+        john = User.objects.create(username="john")
+        mary = User.objects.create(username="mary")
+        Follow.objects.create(user=john).following.add(mary)
+        post = Post.objects.create(creator=mary, content="hello")
+        Post.objects.create(creator=john, content="own post")
+        self.client.force_login(john)
+        response = self.client.get("/following")
+        self.assertEqual(list(response.context["post_list"]), [post])
+
+    def test_profile_follow_state(self):
+        """
+        Verify the profile shows follow counters and state in constant queries
+        """
+        john = User.objects.create(username="john")
+        mary = User.objects.create(username="mary")
+        Follow.objects.create(user=mary).following.add(john)
+        self.client.force_login(john)
+        # session, user, posts, profile user, follows_you, you_follow
+        with self.assertNumQueries(6):
+            response = self.client.get("/mary")
+        self.assertEqual(response.context["profile_user"].following_count, 1)
+        self.assertTrue(response.context["follows_you"])
+        self.assertFalse(response.context["you_follow"])
+
     # def test_logout_redirect(self):
     #     response = self.client.get("/logout")
     #     self.assertEqual(response.status_code, )
@@ -159,3 +236,452 @@ class ViewsTestCase(TestCase):
     #     request = self.factory.get(reverse('following'))
     #     response = following(request)
     #     self.assertEqual(response.status_code, 200)
+
+
+class CursorPaginationTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create 25 posts, with pairs sharing a pub_date to exercise the id tiebreak"""
+        cls.john = User.objects.create(username="john")
+        cls.mary = User.objects.create(username="mary")
+        start = timezone.now()
+        for i in range(25):
+            creator = cls.john if i % 5 else cls.mary
+            Post.objects.create(creator=creator, content=f"post-{i}",
+                                pub_date=start + timedelta(minutes=i // 2))
+
+    def walk(self, url):
+        """Follow next cursors from the first page, return the pages of ids"""
+        pages = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get(url, {"cursor": cursor})
+            page = response.context["page_obj"]
+            pages.append([post.id for post in page])
+            cursor = page.next_cursor
+        return pages
+
+    def test_pages_cover_feed_in_order(self):
+        """
+        Verify walking the cursors returns every post once in feed order
+        """
+        pages = self.walk("/")
+        expected = list(Post.objects.values_list("id", flat=True))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_cursor(self):
+        """
+        Verify the previous cursor of a page returns the page before it
+        """
+        first = self.client.get("/", {"cursor": ""}).context["page_obj"]
+        second = self.client.get("/", {"cursor": first.next_cursor}).context["page_obj"]
+        back = self.client.get("/", {"cursor": second.previous_cursor}).context["page_obj"]
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(first.has_previous())
+
+    def test_no_count_query(self):
+        """
+        Verify cursor pages don't run a COUNT(*) on Post
+        """
+        page = self.client.get("/", {"cursor": ""}).context["page_obj"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/", {"cursor": page.next_cursor})
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+        self.assertEqual(len(queries), 1)
+
+    def test_index_seeks_to_cursor(self):
+        """
+        Verify later pages are a range read of the feed index starting at the cursor
+        """
+        first = self.client.get("/", {"cursor": ""}).context["page_obj"]
+        second = self.client.get("/", {"cursor": first.next_cursor}).context["page_obj"]
+        for cursor, bound in ((first.next_cursor, '"pub_date" <='), (second.previous_cursor, '"pub_date" >=')):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/", {"cursor": cursor})
+            sql = queries[0]["sql"]
+            # Without the plain bound SQLite may plan the OR as a MULTI-INDEX OR and sort
+            self.assertIn(bound, sql)
+            with connection.cursor() as db:
+                db.execute("EXPLAIN QUERY PLAN " + sql.replace("%", "%%"))
+                plan = " ".join(row[-1] for row in db.fetchall())
+            self.assertIn("USING INDEX post_feed_idx (pub_date", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_invalid_cursor(self):
+        """
+        Verify a malformed cursor returns 404
+        """
+        response = self.client.get("/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_profile_feed(self):
+        """
+        Verify the profile feed pages through only that user's posts
+        """
+        pages = self.walk("/mary")
+        expected = list(Post.objects.filter(creator=self.mary).values_list("id", flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+
+class BulkLikeViewTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = User.objects.create(username="john")
+        cls.mary = User.objects.create(username="mary")
+        cls.posts = [Post.objects.create(creator=cls.mary, content=f"post-{i}") for i in range(3)]
+        cls.own_post = Post.objects.create(creator=cls.john, content="own post")
+
+    def setUp(self):
+        self.client.force_login(self.john)
+
+    def post_reactions(self, reactions):
+        body = {"reactions": [{"post": post.id, "like_unlike": value} for post, value in reactions]}
+        return self.client.post("/likes/bulk", json.dumps(body), content_type="application/json")
+
+    def test_creates_and_flips_likes(self):
+        """
+        Verify new reactions are inserted, changed ones updated and counted
+        """
+        Like.objects.create(post=self.posts[0], user=self.john, like_unlike=True)
+        Like.objects.create(post=self.posts[1], user=self.john, like_unlike=True)
+        response = self.post_reactions([
+            (self.posts[0], True), (self.posts[1], False), (self.posts[2], False),
+        ])
+        self.assertEqual(response.json(), {"saved": 2})
+        self.assertEqual(
+            dict(Like.objects.filter(user=self.john).values_list("post_id", "like_unlike")),
+            {self.posts[0].id: True, self.posts[1].id: False, self.posts[2].id: False},
+        )
+        self.assertFalse(Post.objects.drifted().exists())
+
+    def test_string_reactions_parsed(self):
+        """
+        Verify "true"/"false" strings are parsed, and other values rejected
+        """
+        response = self.post_reactions([(self.posts[0], "false"), (self.posts[1], "true")])
+        self.assertEqual(response.json(), {"saved": 2})
+        self.assertEqual(
+            dict(Like.objects.filter(user=self.john).values_list("post_id", "like_unlike")),
+            {self.posts[0].id: False, self.posts[1].id: True},
+        )
+        for value in ("no", 1, None):
+            response = self.post_reactions([(self.posts[2], value)])
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Like.objects.filter(post=self.posts[2]).exists())
+
+    def test_own_post_rejected(self):
+        """
+        Verify liking one's own post rejects the whole batch
+        """
+        response = self.post_reactions([(self.posts[0], True), (self.own_post, True)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.own_post.id), response.json()["errors"])
+        self.assertFalse(Like.objects.exists())
+
+    def test_query_count_independent_of_batch_size(self):
+        """
+        Verify a batch costs the same number of queries for 1 or 3 posts
+        """
+        with CaptureQueriesContext(connection) as single:
+            self.post_reactions([(self.posts[0], True)])
+        Like.objects.all().delete()
+        with CaptureQueriesContext(connection) as batch:
+            self.post_reactions([(post, True) for post in self.posts])
+        self.assertEqual(len(single), len(batch))
+
+    def test_login_required(self):
+        """
+        Verify anonymous requests are refused
+        """
+        self.client.logout()
+        response = self.post_reactions([(self.posts[0], True)])
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_body(self):
+        """
+        Verify a malformed body returns 400
+        """
+        response = self.client.post("/likes/bulk", "not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class PostFeedAPIViewTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = User.objects.create(username="john")
+        cls.mary = User.objects.create(username="mary")
+        for i in range(12):
+            Post.objects.create(creator=cls.mary if i % 2 else cls.john, content=f"post-{i}")
+
+    def test_feeds(self):
+        """
+        Verify each feed returns its posts as JSON with a next cursor
+        """
+        Follow.objects.create(user=self.john).following.add(self.mary)
+        self.client.force_login(self.john)
+        for url, expected in (
+            ("/api/posts", Post.objects.all()),
+            ("/api/posts/following", Post.objects.filter(creator=self.mary)),
+            ("/api/posts/mary", Post.objects.filter(creator=self.mary)),
+        ):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual([post["id"] for post in data["posts"]],
+                                 list(expected.values_list("id", flat=True)[:10]))
+                self.assertEqual(data["next_cursor"] is not None, expected.count() > 10)
+
+    def test_tag_and_mention_feeds(self):
+        """
+        Verify the hashtag and mention feeds return the posts holding them
+        """
+        tagged = Post.objects.create(creator=self.john, content="Hi #CS50 @mary")
+        Post.objects.create(creator=self.mary, content="#other @john")
+        for url in ("/api/posts/tag/cs50", "/api/posts/tag/CS50", "/api/posts/mention/mary"):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual([post["id"] for post in data["posts"]], [tagged.id])
+
+    def test_tag_and_mention_feeds_read_from_index(self):
+        """
+        Verify tag and mention pages are range reads of their indexes, then posts by id
+        """
+        for i in range(12):
+            Post.objects.create(creator=self.john, content=f"#cs50 @mary {i}")
+        for url, index in (("/api/posts/tag/cs50", "post_tag_idx (tag=?"),
+                           ("/api/posts/mention/mary", "mention_user_idx (user_id=?")):
+            with self.subTest(url=url):
+                cursor = self.client.get(url).json()["next_cursor"]
+                with CaptureQueriesContext(connection) as queries:
+                    data = self.client.get(url, {"cursor": cursor}).json()
+                self.assertEqual(len(data["posts"]), 2)
+                page_sql = next(query["sql"] for query in queries if "pub_date\" <=" in query["sql"])
+                self.assertNotIn('"network_post"', page_sql)
+                with connection.cursor() as db:
+                    db.execute("EXPLAIN QUERY PLAN " + page_sql.replace("%", "%%"))
+                    plan = " ".join(row[-1] for row in db.fetchall())
+                self.assertIn(index, plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_not_modified(self):
+        """
+        Verify If-None-Match with the current ETag returns 304 with two queries
+        """
+        response = self.client.get("/api/posts")
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/posts", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_new_post(self):
+        """
+        Verify a new post changes the ETag so clients get the new page
+        """
+        etag = self.client.get("/api/posts")["ETag"]
+        Post.objects.create(creator=self.mary, content="new")
+        response = self.client.get("/api/posts", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["posts"][0]["content"], "new")
+
+    def test_etag_changes_with_like(self):
+        """
+        Verify a like changes the ETag so clients get the new counters
+        """
+        etag = self.client.get("/api/posts")["ETag"]
+        post = Post.objects.filter(creator=self.mary).first()
+        Like.objects.create(post=post, user=self.john, like_unlike=True)
+        response = self.client.get("/api/posts", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        liked = next(row for row in response.json()["posts"] if row["id"] == post.id)
+        self.assertEqual(liked["likes_count"], 1)
+
+    def assertChanged(self, url, change):
+        """Assert a conditional GET of url after change returns the new page"""
+        etag = self.client.get(url)["ETag"]
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response.json()
+
+    def test_etag_changes_with_follows(self):
+        """
+        Verify following and unfollowing change the following feed's ETag,
+        even though the newest post of the feed stays the same
+        """
+        anna = User.objects.create(username="anna")
+        newest = Post.objects.create(creator=anna, content="newest")
+        follow = Follow.objects.create(user=self.john)
+        follow.following.add(anna)
+        self.client.force_login(self.john)
+        url = "/api/posts/following"
+        data = self.assertChanged(url, lambda: follow.following.add(self.mary))
+        self.assertEqual(len(data["posts"]), 7)
+        data = self.assertChanged(url, lambda: follow.following.remove(self.mary))
+        self.assertEqual([post["id"] for post in data["posts"]], [newest.id])
+
+    def test_etag_changes_with_edits_and_deletes(self):
+        """
+        Verify editing or deleting a post other than the newest changes the ETag
+        """
+        oldest = Post.objects.order_by("pub_date", "id").first()
+
+        def edit():
+            oldest.content = "edited"
+            oldest.save()
+
+        self.assertChanged("/api/posts?cursor=" + self.client.get("/api/posts").json()["next_cursor"], edit)
+        data = self.assertChanged("/api/posts", lambda: Post.objects.filter(id=oldest.id).delete())
+        self.assertNotIn(oldest.id, [post["id"] for post in data["posts"]])
+
+    def test_etag_per_viewer(self):
+        """
+        Verify viewers get different ETags, their reactions being in the page
+        """
+        anonymous = self.client.get("/api/posts")["ETag"]
+        self.client.force_login(self.john)
+        john = self.client.get("/api/posts")["ETag"]
+        self.client.force_login(self.mary)
+        response = self.client.get("/api/posts", HTTP_IF_NONE_MATCH=john)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(response["ETag"], (anonymous, john))
+
+    def test_invalid_cursor(self):
+        """
+        Verify a malformed cursor returns 400
+        """
+        response = self.client.get("/api/posts", {"cursor": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TrendingViewTestCase(TestCase):
+
+    def test_trending_order(self):
+        """
+        Verify the trending page lists liked posts by score, in constant queries
+        """
+        john = User.objects.create(username="john")
+        posts = [Post.objects.create(creator=john, content=f"post-{i}") for i in range(3)]
+        for i, post in enumerate(posts):
+            for j in range(i):
+                Like.objects.create(user=User.objects.create(username=f"user-{i}-{j}"),
+                                    post=post, like_unlike=True)
+        trending.update_scores()
+        with self.assertNumQueries(2):
+            response = self.client.get("/trending")
+        self.assertEqual(list(response.context["post_list"]), [posts[2], posts[1]])
+
+
+class SearchViewTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = User.objects.create(username="john")
+        cls.cats = Post.objects.create(creator=cls.john, content="Cats are great, cats cats cats")
+        cls.cat = Post.objects.create(creator=cls.john, content="A post about one cat")
+        Post.objects.create(creator=cls.john, content="Dogs only")
+
+    def search_ids(self, q, **params):
+        response = self.client.get("/search", {"q": q, **params})
+        return [post.id for post in response.context["page_obj"]]
+
+    def test_ranked_matches(self):
+        """
+        Verify posts matching every term are returned best match first
+        """
+        self.assertEqual(self.search_ids("cats"), [self.cats.id, self.cat.id])
+        self.assertEqual(self.search_ids("cat post"), [self.cat.id])
+        self.assertEqual(self.search_ids("gre"), [self.cats.id])
+        self.assertEqual(self.search_ids("birds"), [])
+        self.assertEqual(self.search_ids(""), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """
+        Verify edited and deleted posts are reindexed, like counts aren't
+        """
+        self.cat.content = "Now about birds"
+        self.cat.save()
+        Like.objects.create(user=User.objects.create(username="mary"), post=self.cats, like_unlike=True)
+        self.assertEqual(self.search_ids("birds"), [self.cat.id])
+        self.assertEqual(self.search_ids("cat"), [self.cats.id])
+        self.cats.delete()
+        self.assertEqual(self.search_ids("cat"), [])
+
+    def test_snippet_highlighted_and_escaped(self):
+        """
+        Verify snippets mark the matches and escape the post content
+        """
+        Post.objects.create(creator=self.john, content="<b>parrot</b> talk")
+        response = self.client.get("/search", {"q": "parrot"})
+        self.assertContains(response, "&lt;b&gt;<mark>parrot</mark>&lt;/b&gt; talk", html=False)
+
+    def test_paginated(self):
+        """
+        Verify results are split into pages which keep the query
+        """
+        for i in range(12):
+            Post.objects.create(creator=self.john, content=f"page test {i}")
+        response = self.client.get("/search", {"q": "page test"})
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        self.assertContains(response, "?q=page%20test&page=2")
+        self.assertEqual(len(self.search_ids("page test", page=2)), 2)
+
+    def test_fallback_backend(self):
+        """
+        Verify databases without FTS5 fall back to matching every term
+        """
+        with mock.patch.object(PostSearch, "uses_fts", new_callable=mock.PropertyMock, return_value=False):
+            self.assertCountEqual(self.search_ids("cat"), [self.cats.id, self.cat.id])
+            response = self.client.get("/search", {"q": "one cat"})
+        self.assertEqual([post.id for post in response.context["page_obj"]], [self.cat.id])
+        self.assertContains(response, "A post about <mark>one</mark> <mark>cat</mark>")
+
+
+class AsyncViewsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = User.objects.create(username="john")
+        cls.mary = User.objects.create(username="mary")
+        for i in range(12):
+            Post.objects.create(creator=cls.mary if i % 2 else cls.john, content=f"post-{i}")
+        Follow.objects.create(user=cls.john).following.add(cls.mary)
+
+    def test_async_views_match_sync_views(self):
+        """
+        Verify each async view renders the same posts and template as its sync view
+        """
+        self.client.force_login(self.john)
+        for sync_url, async_url, template in (
+            ("/", "/async/", "network/index.html"),
+            ("/mary", "/async/mary", "network/profile.html"),
+            ("/following", "/async/following", "network/following.html"),
+        ):
+            with self.subTest(url=async_url):
+                expected = self.client.get(sync_url, {"cursor": ""}).context["post_list"]
+                response = self.client.get(async_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTemplateUsed(response, template)
+                self.assertEqual(list(response.context["post_list"]), list(expected))
+
+    def test_async_profile_context(self):
+        """
+        Verify the async profile view shows the follow state
+        """
+        self.client.force_login(self.mary)
+        response = self.client.get("/async/john")
+        self.assertTrue(response.context["follows_you"])
+        self.assertContains(response, "Follows you")
+
+    def test_async_invalid_cursor(self):
+        """
+        Verify a malformed cursor returns 404
+        """
+        response = self.client.get("/async/", {"cursor": "bad"})
+        self.assertEqual(response.status_code, 404)
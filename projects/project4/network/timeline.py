@@ -0,0 +1,154 @@
+"""
+Materialized "following" timelines.
+
+Posts are pushed into each follower's TimelineEntry rows when created
+(fan-out-on-write) so the following page is a bounded indexed read. Posts by
+accounts with more than NETWORK_TIMELINE_FANOUT_LIMIT followers aren't
+pushed, their followers pull them at read time instead (fan-out-on-read).
+The settings are read on each call, so they can be overridden at runtime.
+"""
+import random
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import FollowEdge, Post, TimelineEntry, User
+from .pagination import EntryFeed
+
+
+def timeline_depth():
+    """Return the number of entries kept per timeline"""
+    return getattr(settings, "NETWORK_TIMELINE_DEPTH", 800)
+
+
+def fanout_limit():
+    """Return the follower count above which posts are pulled instead of pushed"""
+    return getattr(settings, "NETWORK_TIMELINE_FANOUT_LIMIT", 5000)
+
+
+def follower_ids(user_id):
+    """Return the ids of the users following user_id"""
+    return FollowEdge.objects.filter(followee_id=user_id).values_list("follower_id", flat=True)
+
+
+def is_pushed(user_id):
+    """Return whether the posts of user_id are fanned out on write"""
+    followers = User.objects.filter(id=user_id).values_list("followers_count", flat=True).first()
+    return (followers or 0) <= fanout_limit()
+
+
+def pulled_followee_ids(user_id):
+    """Return the followees of user_id whose posts are read on demand"""
+    return User.objects.filter(
+        follower_edges__follower_id=user_id,
+        followers_count__gt=fanout_limit(),
+    ).values_list("id", flat=True)
+
+
+def prune(user_ids):
+    """Trim the timelines of user_ids which outgrew their depth plus slack"""
+    depth = timeline_depth()
+    # Entries a timeline may grow past its depth before being pruned
+    slack = max(depth // 10, 1)
+    for user_id in user_ids:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        # An indexed seek to the first entry past the slack, no GROUP BY count
+        if not entries[depth + slack:].exists():
+            continue
+        oldest_kept = entries.values_list("pub_date", flat=True)[depth - 1]
+        entries.filter(pub_date__lt=oldest_kept).delete()
+
+
+def prune_sample(user_ids):
+    """
+    Prune a random 1/slack share of the timelines of user_ids. A timeline
+    gains one entry per push, so each is probed about once per slack posts
+    pushed to it rather than on every post.
+    """
+    slack = max(timeline_depth() // 10, 1)
+    prune([user_id for user_id in user_ids if random.random() * slack < 1])
+
+
+def push_post(post):
+    """Fan a new post out to the timelines of its creator's followers"""
+    if not is_pushed(post.creator_id):
+        return
+    recipients = list(follower_ids(post.creator_id))
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date) for user_id in recipients],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        prune_sample(recipients)
+
+
+def backfill(follower_id, followee_ids):
+    """Copy the recent posts of newly followed users into a timeline"""
+    pushed_ids = User.objects.filter(
+        id__in=followee_ids, followers_count__lte=fanout_limit()
+    ).values_list("id", flat=True)
+    # The newest posts across all of them, as only timeline_depth() are kept
+    posts = (
+        Post.objects.filter(creator_id__in=pushed_ids)
+        .order_by("-pub_date", "-id")
+        .values_list("id", "pub_date")[:timeline_depth()]
+    )
+    entries = [TimelineEntry(user_id=follower_id, post_id=post_id, pub_date=pub_date) for post_id, pub_date in posts]
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+        prune([follower_id])
+
+
+def rebuild(user_ids, using="default"):
+    """
+    Refill the timelines of user_ids from scratch, e.g. after follows and
+    posts were bulk loaded without signals. One INSERT ... SELECT per batch
+    of users keeps the newest timeline_depth() posts of each.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    entry = qn(TimelineEntry._meta.db_table)
+    edge = qn(FollowEdge._meta.db_table)
+    post = qn(Post._meta.db_table)
+    user = qn(User._meta.db_table)
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), 500):
+        batch = user_ids[start:start + 500]
+        with transaction.atomic(using=using):
+            TimelineEntry.objects.using(using).filter(user_id__in=batch).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {entry} (user_id, post_id, pub_date) "
+                    f"SELECT user_id, post_id, pub_date FROM ("
+                    f"  SELECT edge.follower_id AS user_id, post.id AS post_id, post.pub_date,"
+                    f"         ROW_NUMBER() OVER ("
+                    f"             PARTITION BY edge.follower_id ORDER BY post.pub_date DESC, post.id DESC"
+                    f"         ) AS position"
+                    f"  FROM {edge} edge"
+                    f"  JOIN {user} followee ON followee.id = edge.followee_id"
+                    f"  JOIN {post} post ON post.creator_id = edge.followee_id"
+                    f"  WHERE followee.followers_count <= %s"
+                    f"  AND edge.follower_id IN ({', '.join(['%s'] * len(batch))})"
+                    f") entries WHERE position <= %s",
+                    [fanout_limit(), *batch, timeline_depth()],
+                )
+
+
+def remove(follower_id, followee_ids=None):
+    """Drop the posts of unfollowed users, or of everyone, from a timeline"""
+    entries = TimelineEntry.objects.filter(user_id=follower_id)
+    if followee_ids is not None:
+        entries = entries.filter(post__creator_id__in=followee_ids)
+    entries.delete()
+
+
+def following_posts(user):
+    """
+    Return the EntryFeed of the following page of user: the pushed timeline
+    entries, read on timeline_user_idx, merged with the posts of any
+    followees that are pulled on read.
+    """
+    pulled = list(pulled_followee_ids(user.id))
+    extra = [Post.objects.filter(creator_id__in=pulled)] if pulled else []
+    return EntryFeed(Post.objects.for_viewer(user), TimelineEntry.objects.filter(user=user), extra)
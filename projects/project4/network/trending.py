@@ -0,0 +1,122 @@
+"""
+Trending posts.
+
+Every change to a post's like/unlike counters is appended to PostActivity.
+update_scores(), run periodically by the update_trending command, folds
+the activity logged since its last run into PostScore and deletes it, so
+a run costs the activity since the last one rather than the whole Like table
+and the trending feed is an indexed read of PostScore.
+
+Scores decay by half every TRENDING_HALF_LIFE. Instead of rewriting every
+score on each run, activity is weighted by 2 ** ((created - epoch) / half
+life), so newer activity is worth exponentially more, and the ordering of
+the stored scores is that of the decayed ones. The epoch is moved forward,
+rescaling all scores with one UPDATE, before the weights grow too large.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .models import Post, PostActivity, PostScore, TrendingCheckpoint
+
+# Time for the weight of a like to halve
+TRENDING_HALF_LIFE = timedelta(hours=getattr(settings, "NETWORK_TRENDING_HALF_LIFE_HOURS", 6))
+# Score added by a like and taken away by an unlike, worth it when new
+LIKE_WEIGHT = 1.0
+UNLIKE_WEIGHT = 1.0
+# Half-lives after which the epoch is moved forward
+REBASE_AFTER = 32
+# Decayed scores closer to zero than this are dropped
+MIN_SCORE = 0.01
+# Posts whose score is updated per UPDATE statement
+UPDATE_CHUNK = 500
+
+
+def weight(when, epoch):
+    """Return the weight of activity at when relative to epoch"""
+    return 2 ** ((when - epoch) / TRENDING_HALF_LIFE)
+
+
+def add_scores(scores):
+    """Add the {post id: score} deltas to PostScore, creating missing rows"""
+    existing = set(PostScore.objects.filter(post_id__in=scores).values_list("post_id", flat=True))
+    updated = [post_id for post_id in scores if post_id in existing]
+    for start in range(0, len(updated), UPDATE_CHUNK):
+        chunk = updated[start:start + UPDATE_CHUNK]
+        whens = [When(post_id=post_id, then=Value(scores[post_id])) for post_id in chunk]
+        PostScore.objects.filter(post_id__in=chunk).update(
+            score=F("score") + Case(*whens, default=Value(0.0), output_field=FloatField())
+        )
+    # Activity may outlive its post, see PostActivity.post
+    new = Post.objects.filter(id__in=set(scores) - existing).values_list("id", flat=True)
+    PostScore.objects.bulk_create(
+        [PostScore(post_id=post_id, score=scores[post_id]) for post_id in new], batch_size=500
+    )
+
+
+def rebase(checkpoint, now):
+    """Move the epoch to now, rescaling the stored scores to match"""
+    factor = weight(checkpoint.epoch, now)
+    PostScore.objects.update(score=F("score") * factor)
+    checkpoint.epoch = now
+
+
+def prune(checkpoint, now):
+    """Drop the scores which decayed to about zero"""
+    threshold = MIN_SCORE * weight(now, checkpoint.epoch)
+    PostScore.objects.filter(score__lt=threshold, score__gt=-threshold).delete()
+
+
+def fold_activity(checkpoint, batch_size):
+    """
+    Fold up to batch_size activities into the scores. Folded rows are
+    deleted by id rather than up to the checkpoint, as ids needn't commit in
+    order, so activity committed late below the checkpoint is folded next.
+    """
+    rows = list(
+        PostActivity.objects.order_by("id")
+        .values_list("id", "post_id", "likes", "unlikes", "created")[:batch_size]
+    )
+    if not rows:
+        return 0
+    scores = defaultdict(float)
+    for _, post_id, likes, unlikes, created in rows:
+        scores[post_id] += (likes * LIKE_WEIGHT - unlikes * UNLIKE_WEIGHT) * weight(created, checkpoint.epoch)
+    add_scores(scores)
+    checkpoint.last_activity_id = max(checkpoint.last_activity_id, rows[-1][0])
+    folded = [row[0] for row in rows]
+    for start in range(0, len(folded), UPDATE_CHUNK):
+        PostActivity.objects.filter(id__in=folded[start:start + UPDATE_CHUNK]).delete()
+    return len(rows)
+
+
+def update_scores(batch_size=10000, now=None):
+    """
+    Fold all the activity logged since the last run into the trending scores,
+    one transaction per batch, and return the number of activities folded
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = TrendingCheckpoint.objects.select_for_update().get_or_create(
+                pk=1, defaults={"epoch": now}
+            )
+            if now - checkpoint.epoch > REBASE_AFTER * TRENDING_HALF_LIFE:
+                rebase(checkpoint, now)
+            folded = fold_activity(checkpoint, batch_size)
+            if folded < batch_size:
+                prune(checkpoint, now)
+            checkpoint.save()
+        total += folded
+        if folded < batch_size:
+            return total
+
+
+def trending_posts(user):
+    """Return the posts with a positive trending score, highest first"""
+    return Post.objects.for_viewer(user).filter(trending__score__gt=0).order_by("-trending__score", "-id")
@@ -12,5 +12,16 @@ urlpatterns = [
     # path("register", views.register, name="register"),
     path("following", views.FollowingView.as_view(), name="following"),
     path("edit", views.EditView.as_view(), name="edit"),
+    path("trending", views.TrendingView.as_view(), name="trending"),
+    path("search", views.SearchView.as_view(), name="search"),
+    path("likes/bulk", views.BulkLikeView.as_view(), name="bulk_like"),
+    path("api/posts", views.PostFeedAPIView.as_view(), name="api_posts"),
+    path("api/posts/following", views.PostFeedAPIView.as_view(feed="following"), name="api_following"),
+    path("api/posts/tag/<str:tag>", views.PostFeedAPIView.as_view(feed="tag"), name="api_tag"),
+    path("api/posts/mention/<str:username>", views.PostFeedAPIView.as_view(feed="mention"), name="api_mention"),
+    path("api/posts/<str:profile_name>", views.PostFeedAPIView.as_view(feed="profile"), name="api_profile"),
+    path("async/", views.index_async, name="index_async"),
+    path("async/following", views.following_async, name="following_async"),
+    path("async/<str:profile_name>", views.profile_async, name="profile_async"),
     path("<str:profile_name>", views.ProfileView.as_view(), name="profile"),
 ]
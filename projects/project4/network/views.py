@@ -1,3 +1,7 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.mixins import UserPassesTestMixin
@@ -6,24 +10,32 @@ from django.contrib.auth.views import LogoutView as LogoutViewBase
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db.models import Subquery
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.views import View
 from django.views.generic import CreateView, ListView, TemplateView
 
-from .models import Post, User
+from .models import FeedVersion, Like, Mention, Post, PostActivity, PostTag, User
 from .forms import CreateUserForm
+from .pagination import CursorPaginationMixin, EntryFeed, paginate_by_cursor
+from .search import PostSearch
+from . import recommendations, timeline, trending
 
 def index(request):
     return render(request, "network/index.html")
 
 
-class IndexView(ListView):
+class IndexView(CursorPaginationMixin, ListView):
     template_name = "network/index.html"
-    model = Post
     paginate_by = 10
 
+    def get_queryset(self):
+        return Post.objects.for_viewer(self.request.user)
+
 
 class LoginView(SuccessMessageMixin, LoginViewBase):
     template_name = "network/login.html"
@@ -118,9 +130,30 @@ def register(request):
         return render(request, "network/register.html")
 """
 
-class ProfileView(TemplateView):
+class ProfileView(CursorPaginationMixin, ListView):
     template_name = "network/profile.html"
-    pass
+    paginate_by = 10
+
+    def get_queryset(self):
+        return Post.objects.for_viewer(self.request.user).filter(
+            creator__username=self.kwargs["profile_name"]
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(get_profile_context(self.request.user, self.kwargs["profile_name"]))
+        return context
+
+
+def get_profile_context(viewer, profile_name):
+    """Return the profile's follow counters and follow state with the viewer"""
+    context = {"profile_name": profile_name}
+    profile_user = User.objects.filter(username=profile_name).first()
+    context["profile_user"] = profile_user
+    if profile_user and viewer.is_authenticated and viewer != profile_user:
+        context["follows_you"] = profile_user.follows(viewer)
+        context["you_follow"] = viewer.follows(profile_user)
+    return context
 
 
 def profile(request, profile_name):
@@ -131,9 +164,45 @@ def profile(request, profile_name):
     })
 
 
-class FollowingView(TemplateView):
+class FollowingView(CursorPaginationMixin, ListView):
     template_name = "network/following.html"
-    pass
+    paginate_by = 10
+
+    def get_queryset(self):
+        """Serve the page from the user's materialized timeline"""
+        if not self.request.user.is_authenticated:
+            return Post.objects.none()
+        return timeline.following_posts(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.user.is_authenticated:
+            context["suggestions"] = recommendations.suggestions_for(self.request.user)
+        return context
+
+
+class TrendingView(ListView):
+    """Posts ranked by their recent, decayed, likes and unlikes"""
+    template_name = "network/trending.html"
+    paginate_by = 10
+
+    def get_queryset(self):
+        return trending.trending_posts(self.request.user)
+
+
+class SearchView(ListView):
+    """Posts matching the q query parameter, best matches first"""
+    template_name = "network/search.html"
+    context_object_name = "post_list"
+    paginate_by = 10
+
+    def get_queryset(self):
+        return PostSearch(self.request.GET.get("q", ""), self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["q"] = self.request.GET.get("q", "")
+        return context
 
 
 def following(request):
@@ -142,6 +211,96 @@ def following(request):
     })
 
 
+class BulkLikeView(View):
+    """
+    Like/unlike many posts in one request, e.g. when a client syncs its
+    offline queue. Expects a JSON body of the form
+    {"reactions": [{"post": <id>, "like_unlike": <bool>}, ...]}
+    """
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Login required"}, status=403)
+        try:
+            reactions = [
+                (reaction["post"], reaction["like_unlike"])
+                for reaction in json.loads(request.body)["reactions"]
+            ]
+            saved = Like.objects.upsert_for_user(request.user, reactions)
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({"error": "Invalid reactions"}, status=400)
+        except ValidationError as e:
+            errors = {str(post_id): error_list for post_id, error_list in e.message_dict.items()}
+            return JsonResponse({"errors": errors}, status=400)
+        return JsonResponse({"saved": saved})
+
+
+class PostFeedAPIView(View):
+    """
+    JSON version of the all posts, following and profile feeds, and of the
+    hashtag and mention feeds, paginated by cursor. Responses carry a weak
+    ETag derived from the newest post in the feed and the latest like
+    activity, so polling clients sending If-None-Match get a 304 after two
+    indexed lookups instead of the page query.
+    """
+    feed = "all"
+    page_size = 10
+
+    def get_queryset(self):
+        if self.feed == "following":
+            if not self.request.user.is_authenticated:
+                return Post.objects.none()
+            return timeline.following_posts(self.request.user)
+        posts = Post.objects.for_viewer(self.request.user)
+        if self.feed == "profile":
+            return posts.filter(creator__username=self.kwargs["profile_name"])
+        # Tag and mention pages are read from their own (tag/user, -pub_date, -post) indexes
+        if self.feed == "tag":
+            return EntryFeed(posts, PostTag.objects.filter(tag=self.kwargs["tag"].lower()))
+        if self.feed == "mention":
+            return EntryFeed(posts, Mention.objects.filter(user__username=self.kwargs["username"]))
+        return posts
+
+    def get_etag(self, queryset, cursor):
+        """
+        Return a weak ETag for the newest (pub_date, id) of the feed, the
+        last change to any post's like/unlike counters, the post edits and
+        deletes, and the viewer's follow changes
+        """
+        if isinstance(queryset, EntryFeed):
+            newest = queryset.newest()
+        else:
+            newest = queryset.order_by("-pub_date", "-id").values_list("pub_date", "id").first()
+        # Pages carry the viewer's own reactions, see Post.objects.for_viewer
+        viewer = (self.request.user.pk, getattr(self.request.user, "following_version", None))
+        # Every counter change is logged to PostActivity, see trending.py
+        activity = PostActivity.objects.order_by("-id").values("id")[:1]
+        versions = FeedVersion.objects.filter(pk=1).annotate(activity=Subquery(activity))
+        watermarks = versions.values_list("version", "activity").first()
+        key = f"{self.feed}:{self.kwargs}:{viewer}:{cursor}:{newest}:{watermarks}"
+        return f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        cursor = request.GET.get("cursor", "")
+        etag = self.get_etag(queryset, cursor)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                page = paginate_by_cursor(queryset, self.page_size, cursor)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            response = JsonResponse({
+                "posts": [post.serialize() for post in page],
+                "next_cursor": page.next_cursor,
+                "previous_cursor": page.previous_cursor,
+            })
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+
 class EditView(TemplateView):
     template_name = "network/edit.html"
     pass
@@ -151,3 +310,52 @@ def edit(request):
     return render(request, "network/edit.html", {
         # "profile_name": profile_name,
     })
+
+
+# Async variants of the read views, served under /async/ for ASGI deployments.
+# Django 3.2 has neither an async ORM nor async template rendering, so each
+# view does all its queries in one sync_to_async hop (the request user and
+# session included), then renders on the event loop from the fetched objects.
+
+def _load_feed(request, get_queryset, get_extra_context=None):
+    """Resolve the request user, then fetch the feed page and extra context"""
+    user = request.user
+    user.is_authenticated  # loads the session and user while in sync code
+    try:
+        page = paginate_by_cursor(get_queryset(user), 10, request.GET.get("cursor", ""))
+    except ValueError as e:
+        raise Http404(str(e))
+    context = {
+        "post_list": page.object_list,
+        "page_obj": page,
+        "is_paginated": page.has_other_pages(),
+    }
+    if get_extra_context:
+        context.update(get_extra_context(user))
+    return context
+
+
+async def _render_feed(request, template_name, get_queryset, get_extra_context=None):
+    context = await sync_to_async(_load_feed)(request, get_queryset, get_extra_context)
+    return render(request, template_name, context)
+
+
+async def index_async(request):
+    return await _render_feed(request, "network/index.html", Post.objects.for_viewer)
+
+
+async def profile_async(request, profile_name):
+    return await _render_feed(
+        request,
+        "network/profile.html",
+        lambda user: Post.objects.for_viewer(user).filter(creator__username=profile_name),
+        lambda user: get_profile_context(user, profile_name),
+    )
+
+
+async def following_async(request):
+    def get_queryset(user):
+        if not user.is_authenticated:
+            return Post.objects.none()
+        return timeline.following_posts(user)
+    return await _render_feed(request, "network/following.html", get_queryset)
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project4.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from network.events import events_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Long lived server-sent events connections bypass Django's handler,
+    # which would hold a thread per streaming response
+    if scope["type"] == "http" and scope["path"] == "/events/posts":
+        return await events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
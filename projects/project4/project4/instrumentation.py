@@ -0,0 +1,263 @@
+"""
+Per-view performance instrumentation.
+
+InstrumentationMiddleware records, for every request, the number of SQL
+queries and the time spent running them, the time spent rendering
+templates, the total time and the response size. It:
+
+- adds them to the response as a Server-Timing header, shown by the
+  browser's network panel
+- logs a warning naming the statement when one SQL statement runs more
+  than INSTRUMENTATION_REPEATED_QUERIES times in a request, the signature
+  of an N+1 query in a template loop
+- aggregates them into per-route histograms, appended as one JSON line
+  per flush to INSTRUMENTATION_FILE every INSTRUMENTATION_FLUSH_INTERVAL
+  seconds
+
+Unless INSTRUMENTATION_ENABLED is set the middleware removes itself from
+the chain when Django loads it, so it costs nothing at all. It runs sync or
+async, following the rest of the chain, so under ASGI it doesn't push async
+views through a thread.
+
+The module is copied as is into each project of the repository, keep the
+copies identical.
+"""
+import asyncio
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import base as template_base
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, the last bucket is unbounded
+TIME_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+_current = contextvars.ContextVar("instrumentation_stats", default=None)
+_template_depth = contextvars.ContextVar("instrumentation_template_depth", default=0)
+_original_render = None
+
+
+class RequestStats:
+    """Counters of a request being instrumented"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def count(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+def _timed_render(self, context):
+    """Template.render, adding the time of outermost renders to the request"""
+    stats = _current.get()
+    if stats is None:
+        return _original_render(self, context)
+    depth = _template_depth.get()
+    token = _template_depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        _template_depth.reset(token)
+        if not depth:
+            stats.template_time += time.perf_counter() - start
+
+
+def _counted_execute(execute, sql, params, many, context):
+    """Execute wrapper adding the query to the stats of the current request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.count(execute, sql, params, many, context)
+
+
+def install_query_counters(**kwargs):
+    """
+    Run every query of this thread's connections through _counted_execute.
+    Each query is added to the stats found in the context, which
+    sync_to_async copies into its thread, so requests sharing a connection
+    count their own queries only. Connected to request_started, sent in the
+    thread running the request's queries, and connection_created.
+    """
+    for connection in connections.all():
+        if _counted_execute not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_counted_execute)
+
+
+def install_template_timer():
+    """Wrap Template.render once so template time can be measured"""
+    global _original_render
+    if _original_render is None:
+        _original_render = template_base.Template.render
+        template_base.Template.render = _timed_render
+
+
+class Histogram:
+    """Counts of values per bucket plus their total"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def as_dict(self):
+        return {"bounds": self.bounds, "counts": self.counts, "total": round(self.total, 3)}
+
+
+class RouteStats:
+    """Histograms of the requests to one route"""
+
+    def __init__(self):
+        self.requests = 0
+        self.max_queries = 0
+        self.response_bytes = 0
+        self.total_ms = Histogram(TIME_BUCKETS_MS)
+        self.sql_ms = Histogram(TIME_BUCKETS_MS)
+        self.template_ms = Histogram(TIME_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+
+    def add(self, stats, total_ms, size):
+        self.requests += 1
+        self.max_queries = max(self.max_queries, stats.queries)
+        self.response_bytes += size
+        self.total_ms.add(total_ms)
+        self.sql_ms.add(stats.sql_time * 1000)
+        self.template_ms.add(stats.template_time * 1000)
+        self.queries.add(stats.queries)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "max_queries": self.max_queries,
+            "response_bytes": self.response_bytes,
+            "total_ms": self.total_ms.as_dict(),
+            "sql_ms": self.sql_ms.as_dict(),
+            "template_ms": self.template_ms.as_dict(),
+            "queries": self.queries.as_dict(),
+        }
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path = getattr(settings, "INSTRUMENTATION_FILE", "instrumentation.jsonl")
+        self.flush_interval = getattr(settings, "INSTRUMENTATION_FLUSH_INTERVAL", 60)
+        self.repeated_queries = getattr(settings, "INSTRUMENTATION_REPEATED_QUERIES", 5)
+        self.routes = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        install_template_timer()
+        install_query_counters()
+        request_started.connect(install_query_counters, dispatch_uid="instrumentation_request_started")
+        connection_created.connect(install_query_counters, dispatch_uid="instrumentation_connection_created")
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, stats, start)
+
+    def process(self, request, response, stats, start):
+        """Report and record the stats of a finished request"""
+        total_ms = (time.perf_counter() - start) * 1000
+
+        size = 0 if response.streaming else len(response.content)
+        response["Server-Timing"] = self.server_timing(stats, total_ms, size)
+        route = self.route_name(request)
+        self.check_repeated_queries(stats, route)
+        self.record(route, stats, total_ms, size)
+        return response
+
+    @staticmethod
+    def route_name(request):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "<unresolved>"
+        return f"{request.method} /{route}"
+
+    @staticmethod
+    def server_timing(stats, total_ms, size):
+        return ", ".join([
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries"',
+            f"tpl;dur={stats.template_time * 1000:.1f}",
+            f"total;dur={total_ms:.1f}",
+            f'size;desc="{size} bytes"',
+        ])
+
+    def check_repeated_queries(self, stats, route):
+        if not stats.statements:
+            return
+        sql, count = stats.statements.most_common(1)[0]
+        if count > self.repeated_queries:
+            logger.warning("%s ran the same query %d times, possible N+1: %s", route, count, sql)
+
+    def record(self, route, stats, total_ms, size):
+        with self.lock:
+            self.routes.setdefault(route, RouteStats()).add(stats, total_ms, size)
+            if time.monotonic() - self.last_flush < self.flush_interval:
+                return
+            routes, self.routes = self.routes, {}
+            self.last_flush = time.monotonic()
+        self.flush(routes)
+
+    def flush(self, routes):
+        """Append the histograms of routes to the file as one JSON line"""
+        line = json.dumps({
+            "time": time.time(),
+            "pid": os.getpid(),
+            "routes": {route: route_stats.as_dict() for route, route_stats in routes.items()},
+        })
+        try:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+        except OSError:
+            logger.exception("Couldn't write instrumentation to %s", self.path)
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'project4.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +52,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query count, SQL/template time and response size, reported in
+# Server-Timing headers and flushed to INSTRUMENTATION_FILE, see
+# project4/instrumentation.py. Set INSTRUMENTATION_ENABLED=1 to turn it on.
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED') == '1'
+INSTRUMENTATION_FILE = os.path.join(BASE_DIR, 'instrumentation.jsonl')
+INSTRUMENTATION_FLUSH_INTERVAL = 60
+INSTRUMENTATION_REPEATED_QUERIES = 5
+
 ROOT_URLCONF = 'project4.urls'
 
 TEMPLATES = [
@@ -78,12 +87,25 @@ WSGI_APPLICATION = 'project4.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # DATABASE_PATH lets the benchmarks serve a separate, seeded, database
+        'NAME': os.environ.get('DATABASE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
 AUTH_USER_MODEL = "network.User"
 
+# "Following" timelines, see network/timeline.py
+NETWORK_TIMELINE_DEPTH = 800
+NETWORK_TIMELINE_FANOUT_LIMIT = 5000
+
+# Hours for the weight of a like in the trending scores to halve, see
+# network/trending.py
+NETWORK_TRENDING_HALF_LIFE_HOURS = 6
+
+# Server-sent events of new posts, see network/events.py. Use
+# "network.events.DatabaseBackend" when running several ASGI workers
+NETWORK_EVENTS_BACKEND = "network.events.LocalBackend"
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
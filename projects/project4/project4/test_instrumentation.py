@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+
+from network.models import User
+from .instrumentation import InstrumentationMiddleware, install_query_counters
+
+
+class InstrumentationMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "instrumentation.jsonl")
+        self.factory = RequestFactory()
+
+    def middleware(self, view, **settings):
+        settings = {
+            "INSTRUMENTATION_ENABLED": True,
+            "INSTRUMENTATION_FILE": self.path,
+            "INSTRUMENTATION_FLUSH_INTERVAL": 3600,
+            **settings,
+        }
+        with override_settings(**settings):
+            return InstrumentationMiddleware(view)
+
+    def test_disabled(self):
+        """
+        Verify the middleware drops out of the chain unless enabled
+        """
+        with override_settings(INSTRUMENTATION_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            InstrumentationMiddleware(lambda request: HttpResponse())
+        response = self.client.get("/login")
+        self.assertNotIn("Server-Timing", response)
+
+    def test_wired_first(self):
+        """
+        Verify the project's MIDDLEWARE runs it first, reporting on every request once enabled
+        """
+        self.assertEqual(settings.MIDDLEWARE[0], "project4.instrumentation.InstrumentationMiddleware")
+        with override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_FILE=self.path):
+            response = self.client.get("/login")
+        self.assertIn("Server-Timing", response)
+
+    def test_server_timing(self):
+        """
+        Verify the queries, template time and response size are sent as Server-Timing
+        """
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse(Template("{{ text }}").render(Context({"text": "hello"})))
+
+        response = self.middleware(view)(self.factory.get("/"))
+        timing = response["Server-Timing"]
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn("tpl;dur=", timing)
+        self.assertIn('size;desc="5 bytes"', timing)
+
+    def test_repeated_queries_logged(self):
+        """
+        Verify a statement repeated past the threshold is logged as a possible N+1
+        """
+        def view(request):
+            for i in range(4):
+                User.objects.filter(id=i).exists()
+            return HttpResponse()
+
+        with self.assertLogs("project4.instrumentation", "WARNING") as logs:
+            self.middleware(view, INSTRUMENTATION_REPEATED_QUERIES=3)(self.factory.get("/"))
+        self.assertIn("same query 4 times", logs.output[0])
+
+    def test_flush_histograms(self):
+        """
+        Verify per-route histograms are appended to the file once the interval passed
+        """
+        middleware = self.middleware(lambda request: HttpResponse("ok"), INSTRUMENTATION_FLUSH_INTERVAL=0)
+        middleware(self.factory.get("/"))
+        with open(self.path) as f:
+            line = json.loads(f.readline())
+        route = line["routes"]["GET /<unresolved>"]
+        self.assertEqual(route["requests"], 1)
+        self.assertEqual(route["response_bytes"], 2)
+        self.assertEqual(sum(route["queries"]["counts"]), 1)
+
+    async def test_async_chain(self):
+        """
+        Verify an async chain is awaited without a thread hop and its queries counted
+        """
+        async def view(request):
+            await sync_to_async(lambda: list(User.objects.all()))()
+            return HttpResponse("ok")
+
+        # Loaded in the thread running the queries, as ASGIHandler sends request_started
+        middleware = await sync_to_async(self.middleware)(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = await middleware(self.factory.get("/"))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    async def test_concurrent_requests(self):
+        """
+        Verify concurrent async requests sharing a connection count their own queries only
+        """
+        async def view(request):
+            for i in range(int(request.GET["queries"])):
+                await sync_to_async(User.objects.filter(id=i).exists)()
+            return HttpResponse()
+
+        middleware = await sync_to_async(self.middleware)(view, INSTRUMENTATION_REPEATED_QUERIES=10)
+        with self.assertNoLogs("project4.instrumentation", "WARNING"):
+            responses = await asyncio.gather(*[
+                middleware(self.factory.get("/", {"queries": queries})) for queries in (1, 10, 3)
+            ])
+        self.assertEqual(
+            [response["Server-Timing"].split(", ")[0].split(";desc=")[1] for response in responses],
+            ['"1 queries"', '"10 queries"', '"3 queries"'],
+        )
+
+    async def test_wired_async(self):
+        """
+        Verify an ASGI request to an async view is instrumented, queries included
+        """
+        # Unlike ASGIHandler, the test client sends request_started in another
+        # thread than the request's queries
+        await sync_to_async(install_query_counters)()
+        with override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_FILE=self.path):
+            response = await self.async_client.get("/async/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
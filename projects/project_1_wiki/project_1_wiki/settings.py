@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'project_1_wiki.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +52,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query count, SQL/template time and response size, reported in
+# Server-Timing headers and flushed to INSTRUMENTATION_FILE, see
+# project_1_wiki/instrumentation.py. Set INSTRUMENTATION_ENABLED=1 to turn it on.
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED') == '1'
+INSTRUMENTATION_FILE = BASE_DIR / 'instrumentation.jsonl'
+INSTRUMENTATION_FLUSH_INTERVAL = 60
+INSTRUMENTATION_REPEATED_QUERIES = 5
+
 ROOT_URLCONF = 'project_1_wiki.urls'
 
 TEMPLATES = [
@@ -24,7 +24,7 @@ class CommentAdmin(admin.ModelAdmin):
 
 class ListingAdmin(admin.ModelAdmin):
     list_filter = ['active', "category" ]
-    list_display = ( "__str__", "category","creator", "pub_date", "active", )
+    list_display = ( "__str__", "category","creator", "pub_date", "end_date", "active", )
 
 
 class WatchlistAdmin(admin.ModelAdmin):
@@ -1,5 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from .signals import (
+    bid_deleted, category_saved, comment_saved, listing_counted, listing_deleted, listing_saved,
+    listing_state_loaded, listing_uncounted,
+)
 
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        bid = self.get_model("Bid")
+        category = self.get_model("Category")
+        comment = self.get_model("Comment")
+        listing = self.get_model("Listing")
+        post_delete.connect(bid_deleted, sender=bid, dispatch_uid="bid_deleted")
+        post_save.connect(category_saved, sender=category, dispatch_uid="category_saved")
+        post_save.connect(comment_saved, sender=comment, dispatch_uid="comment_saved")
+        post_delete.connect(comment_saved, sender=comment, dispatch_uid="comment_deleted")
+        post_save.connect(listing_saved, sender=listing, dispatch_uid="listing_saved")
+        post_delete.connect(listing_saved, sender=listing, dispatch_uid="listing_deleted")
+        post_delete.connect(listing_deleted, sender=listing, dispatch_uid="listing_mark_dropped")
+        pre_save.connect(listing_state_loaded, sender=listing, dispatch_uid="listing_state_loaded")
+        pre_delete.connect(listing_state_loaded, sender=listing, dispatch_uid="listing_deleted_state_loaded")
+        post_save.connect(listing_counted, sender=listing, dispatch_uid="listing_counted")
+        post_delete.connect(listing_uncounted, sender=listing, dispatch_uid="listing_uncounted")
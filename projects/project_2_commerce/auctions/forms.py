@@ -1,4 +1,7 @@
-from django.forms import ModelForm
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.forms import ChoiceField, DateTimeInput, Form, IntegerField, ModelForm
+from django.utils import timezone
 
 from .models import Bid, Listing
 
@@ -10,10 +13,51 @@ def is_valid_bid():
 class ListingForm(ModelForm):
     class Meta:
         model = Listing
-        fields = ['name', 'description', 'category', 'starting_bid', 'image']
+        fields = ['name', 'description', 'category', 'starting_bid', 'image', 'end_date']
+        widgets = {
+            'end_date': DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        }
+
+    def clean_end_date(self):
+        end_date = self.cleaned_data['end_date']
+        if end_date is not None and end_date <= timezone.now():
+            raise ValidationError("The end date must be in the future")
+        return end_date
 
 
 class BidForm(ModelForm):
     class Meta:
         model = Bid
         fields = ['amount', 'bidder', 'listing']
+
+
+class ListingFilterForm(Form):
+    """Filters and sort of the listings of a category page, read from the query string"""
+    STATUSES = [('active', 'Active'), ('closed', 'Closed'), ('all', 'All')]
+    SORTS = [('newest', 'Newest'), ('ending', 'Ending soonest'),
+             ('price', 'Lowest price'), ('-price', 'Highest price')]
+    ORDERINGS = {
+        'newest': ['-pub_date', '-id'],
+        'ending': [F('end_date').asc(nulls_last=True), 'id'],
+        'price': ['price', 'id'],
+        '-price': ['-price', '-id'],
+    }
+
+    status = ChoiceField(choices=STATUSES, required=False)
+    min_price = IntegerField(min_value=0, required=False)
+    max_price = IntegerField(min_value=0, required=False)
+    sort = ChoiceField(choices=SORTS, required=False)
+
+    def filter(self, listings):
+        """Return the listings filtered and sorted as asked, ignoring invalid fields"""
+        self.is_valid()
+        data = self.cleaned_data
+        status = data.get('status') or 'active'
+        listings = listings.with_price()
+        if status != 'all':
+            listings = listings.filter(active=status == 'active')
+        if data.get('min_price') is not None:
+            listings = listings.filter(price__gte=data['min_price'])
+        if data.get('max_price') is not None:
+            listings = listings.filter(price__lte=data['max_price'])
+        return listings.order_by(*self.ORDERINGS[data.get('sort') or 'newest'])
@@ -0,0 +1,62 @@
+"""
+Cache of the parts of a listing page shared by every visitor.
+
+The listing, with its category, and the rendered details and first page of
+comments are cached per listing in the AUCTIONS_LISTING_CACHE cache, so
+an anonymous visitor's render runs no query. The per-user parts (watchlist
+state, "you are leading", the forms) are rendered on top of it from the
+cached listing.
+
+Entries are deleted once a change to the listing commits: a bid (place_bid,
+the bid pipeline, a deleted bid), a comment, a close, an edit or a save of
+its category. A render started before the change can still store the old
+page after the delete, which AUCTIONS_LISTING_CACHE_TIMEOUT bounds.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .pagination import comments_page
+
+CACHE_ALIAS = getattr(settings, "AUCTIONS_LISTING_CACHE", "default")
+TIMEOUT = getattr(settings, "AUCTIONS_LISTING_CACHE_TIMEOUT", 300)
+
+
+def cache_key(listing_id):
+    return f"auctions:listing:{listing_id}"
+
+
+def listing_page(listing_id):
+    """
+    Return the cached {listing, details, comments} of a listing page, None
+    if the listing doesn't exist
+    """
+    from .models import Listing
+
+    cache = caches[CACHE_ALIAS]
+    key = cache_key(listing_id)
+    page = cache.get(key)
+    if page is None:
+        listing = Listing.objects.select_related("category").filter(pk=listing_id).first()
+        if listing is None:
+            return None
+        comments, next_cursor = comments_page(listing)
+        page = {
+            "listing": listing,
+            "details": render_to_string("auctions/listing_details.html", {"listing": listing}),
+            "comments": render_to_string("auctions/listing_comments.html", {
+                "listing": listing,
+                "comments": comments,
+                "next_cursor": next_cursor,
+            }),
+        }
+        cache.set(key, page, TIMEOUT)
+    return page
+
+
+def listing_changed(*listing_ids):
+    """Drop the cached pages of the listings once the transaction commits"""
+    keys = [cache_key(listing_id) for listing_id in listing_ids]
+    if keys:
+        transaction.on_commit(lambda: caches[CACHE_ALIAS].delete_many(keys))
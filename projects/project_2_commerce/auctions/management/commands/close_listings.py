@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.scheduler import CloseScheduler
+
+
+class Command(BaseCommand):
+    help = "Close the listings whose end date passed, recording their winning bids"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Listings loaded per query and closed per UPDATE",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Keep running, checking for new listings at least every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        scheduler = CloseScheduler(batch_size=options["batch_size"])
+        if not options["interval"]:
+            self.report(scheduler.tick())
+            return
+        scheduler.run(options["interval"], on_tick=lambda closed: closed and self.report(closed))
+
+    def report(self, closed):
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} listing(s)"))
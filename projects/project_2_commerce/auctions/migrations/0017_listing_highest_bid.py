@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_highest_bid(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    highest = {}
+    for listing_id, amount, bidder_id in Bid.objects.exclude(listing=None).order_by(
+            'listing', '-amount', '-id').values_list('listing', 'amount', 'bidder'):
+        highest.setdefault(listing_id, (amount, bidder_id))
+    for listing_id, (amount, bidder_id) in highest.items():
+        Listing.objects.filter(pk=listing_id).update(highest_bid_amount=amount, highest_bidder=bidder_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_auto_20210427_1036'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bid_amount',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bidder',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leading', to='auctions.user'),
+        ),
+        migrations.RunPython(backfill_highest_bid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_listing_highest_bid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='end_date',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='end date'),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='winning_bid',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='won', to='auctions.bid'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['active', 'end_date'], name='listing_active_end_idx'),
+        ),
+    ]
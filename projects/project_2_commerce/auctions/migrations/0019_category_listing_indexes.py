@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:47
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.comparison
+
+
+def count_active_listings(apps, schema_editor):
+    Category = apps.get_model('auctions', 'Category')
+    Listing = apps.get_model('auctions', 'Listing')
+    active = (Listing.objects.filter(category=models.OuterRef('pk'), active=True).order_by()
+              .values('category').annotate(total=models.Count('id')).values('total'))
+    Category.objects.update(
+        active_count=django.db.models.functions.comparison.Coalesce(models.Subquery(active), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_listing_end_date'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_active_end_idx',
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='active_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('active', True)), fields=['category', '-pub_date', '-id'], name='listing_category_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('active', True)), fields=['category', 'end_date'], name='listing_category_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(django.db.models.expressions.F('category'), django.db.models.functions.comparison.Coalesce('highest_bid_amount', 'starting_bid'), condition=models.Q(('active', True)), name='listing_category_price_idx'),
+        ),
+        migrations.RunPython(count_active_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_category_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['listing', 'comment_date', 'id'], name='comment_listing_date_idx'),
+        ),
+    ]
@@ -1,19 +1,69 @@
+from collections import Counter
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .listing_cache import listing_changed
+
 
 class User(AbstractUser):
     def __str__(self):
         return f"{self.username}"
 
 
+class CategoryQuerySet(models.QuerySet):
+
+    def recount(self):
+        """Recompute the stored active listing counts in one UPDATE"""
+        active = (Listing.objects.filter(category=models.OuterRef('pk'), active=True).order_by()
+                  .values('category').annotate(total=models.Count('id')).values('total'))
+        return self.update(active_count=Coalesce(models.Subquery(active), 0))
+
+
 class Category(models.Model):
     name = models.CharField(max_length=40)
+    # Denormalized number of active listings, maintained by the Listing
+    # signals and ListingQuerySet.close
+    active_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name}"
 
+    @staticmethod
+    def adjust_active_counts(deltas):
+        """Add the {category id: delta} changes to the active listing counts"""
+        for category_id, delta in deltas.items():
+            if delta:
+                Category.objects.filter(pk=category_id).update(active_count=models.F('active_count') + delta)
+
+
+class ListingQuerySet(models.QuerySet):
+
+    def close(self):
+        """Close the active listings, recording their highest bid as the winning one"""
+        with transaction.atomic():
+            rows = list(self.filter(active=True).select_for_update().order_by().values_list('pk', 'category'))
+            ids = [pk for pk, _ in rows]
+            highest = Bid.objects.filter(listing=models.OuterRef('pk')).order_by('-amount', 'id')
+            closed = Listing.objects.filter(pk__in=ids, active=True).update(
+                active=False, winning_bid=models.Subquery(highest.values('id')[:1]))
+            categories = Counter(category_id for _, category_id in rows)
+            if closed == len(rows):
+                Category.adjust_active_counts({category_id: -n for category_id, n in categories.items()})
+            else:
+                # Some were closed meanwhile, don't know which
+                Category.objects.filter(pk__in=categories).recount()
+        listing_changed(*ids)
+        return closed
+
+    def with_price(self):
+        """Annotate the listings with their current price, the highest bid or else the starting bid"""
+        return self.annotate(price=Listing.PRICE)
+
 
 class Listing(models.Model):
     name = models.CharField(max_length=40)
@@ -25,9 +75,32 @@ class Listing(models.Model):
     active = models.BooleanField(default=True)
     image = models.URLField(blank=True)
     pub_date = models.DateTimeField('listing date', default=timezone.now)
+    # Closed by the close_listings scheduler once passed
+    end_date = models.DateTimeField('end date', null=True, blank=True)
+    winning_bid = models.OneToOneField('Bid', on_delete=models.SET_NULL, null=True, blank=True,
+                                       editable=False, related_name="won")
+    # Denormalized highest Bid, maintained by place_bid and signals.bid_deleted
+    highest_bid_amount = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    highest_bidder = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                       editable=False, related_name="leading")
+
+    objects = ListingQuerySet.as_manager()
+
+    # Current price, as annotated by ListingQuerySet.with_price
+    PRICE = Coalesce('highest_bid_amount', 'starting_bid')
 
     class Meta:
         ordering = ['pub_date']
+        indexes = [
+            # Sorts of the active listings of a category, see forms.ListingFilterForm.
+            # Partial, as SQLite can't use an index for a bare boolean column
+            models.Index(fields=['category', '-pub_date', '-id'], name='listing_category_new_idx',
+                         condition=models.Q(active=True)),
+            models.Index(fields=['category', 'end_date'], name='listing_category_end_idx',
+                         condition=models.Q(active=True)),
+            models.Index(models.F('category'), Coalesce('highest_bid_amount', 'starting_bid'),
+                         name='listing_category_price_idx', condition=models.Q(active=True)),
+        ]
 
     @property
     def current_bid(self):
@@ -35,14 +108,41 @@ class Listing(models.Model):
 
     @property
     def current_bid_amount(self):
-        return self.current_bid.amount if self.current_bid else self.starting_bid
+        if self.highest_bid_amount is None:
+            return self.starting_bid
+        return self.highest_bid_amount
+
+    @staticmethod
+    def outbid_by(amount):
+        """Return the condition of listings whose current bid is below amount"""
+        return (models.Q(highest_bid_amount__lt=amount)
+                | models.Q(highest_bid_amount__isnull=True, starting_bid__lt=amount))
 
     def place_bid(self, new_bid):
         # Place submitted bid if higher than current bid
-        if new_bid.amount > self.current_bid_amount:
+        # The comparison is made by the UPDATE itself, which locks the row, so
+        # of concurrent bids only those still higher when they get the lock win
+        amount = new_bid.amount
+        with transaction.atomic():
+            placed = Listing.objects.filter(self.outbid_by(amount), pk=self.pk, active=True).update(
+                highest_bid_amount=amount, highest_bidder=new_bid.bidder_id)
+            if not placed:
+                return False
+            new_bid.listing = self
             new_bid.save()
-            return True
-        return False
+            listing_changed(self.pk)
+        self.highest_bid_amount = amount
+        self.highest_bidder_id = new_bid.bidder_id
+        return True
+
+    def refresh_highest_bid(self):
+        """Recompute the highest bid fields from the Bid table"""
+        highest = self.bids.order_by('-amount', 'id')
+        if Listing.objects.filter(pk=self.pk).update(
+                highest_bid_amount=models.Subquery(highest.values('amount')[:1]),
+                highest_bidder=models.Subquery(highest.values('bidder')[:1])):
+            listing_changed(self.pk)
+            self.refresh_from_db(fields=['highest_bid_amount', 'highest_bidder'])
 
     def __str__(self):
         return f"#{self.pk} - {self.name}"
@@ -91,6 +191,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-listing', 'comment_date']
+        indexes = [
+            # Keyset pagination of a listing's comments, see pagination.comments_page
+            models.Index(fields=['listing', 'comment_date', 'id'], name='comment_listing_date_idx'),
+        ]
 
     def __str__(self):
         return f"[{self.listing}] {self.pk}: - {self.detail[:30]}"
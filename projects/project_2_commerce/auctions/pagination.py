@@ -0,0 +1,52 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Comments per page of a listing
+COMMENTS_PAGE_SIZE = 20
+
+
+def encode_cursor(comment_date, pk):
+    """Return an opaque cursor for the (comment_date, id) position of a comment"""
+    position = {"d": comment_date.isoformat(), "i": pk}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (comment_date, id) position held by a cursor"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        comment_date = parse_datetime(position["d"])
+        pk = int(position["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if comment_date is None:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return comment_date, pk
+
+
+def comments_page(listing, cursor=None, page_size=COMMENTS_PAGE_SIZE):
+    """
+    Return the comments of a listing after the cursor, oldest first, and the
+    cursor of the next page, None on the last one.
+
+    Each page is a range read on the (listing, comment_date, id) index
+    starting from the cursor position, so later pages cost the same as the
+    first.
+    """
+    comments = listing.comments.select_related("commenter").order_by("comment_date", "id")
+    if cursor:
+        comment_date, pk = decode_cursor(cursor)
+        # The redundant comment_date bound lets the index seek to the cursor
+        comments = comments.filter(
+            Q(comment_date__gt=comment_date) | Q(comment_date=comment_date, id__gt=pk),
+            comment_date__gte=comment_date,
+        )
+    rows = list(comments[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    last = rows[page_size - 1]
+    return rows[:page_size], encode_cursor(last.comment_date, last.pk)
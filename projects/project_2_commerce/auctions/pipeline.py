@@ -0,0 +1,149 @@
+"""
+Bid ingestion pipeline, used by the bid endpoint when AUCTIONS_BID_PIPELINE
+is set.
+
+The pipeline keeps the highest amount seen for every listing it has taken
+bids on (its high-water mark). A bid not above the mark is rejected at once
+without touching the database. A bid above it becomes the new mark and is
+queued, and every AUCTIONS_BID_BATCH_WINDOW seconds a background thread
+commits the queued bids with, per listing, one transaction holding one
+conditional UPDATE of the denormalized highest bid and one bulk INSERT.
+Callers wait for the commit of their bid's batch, so the result they get
+is the stored one.
+
+The marks are per process. Bids placed elsewhere (another process,
+Listing.place_bid) are caught by the conditional UPDATE: when it fails the
+listing's queued bids are placed one by one, as place_bid would, and its
+mark is reloaded.
+"""
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .listing_cache import listing_changed
+from .models import Bid, Listing
+
+# Seconds a bid may wait in the queue before its batch is committed
+BATCH_WINDOW = getattr(settings, "AUCTIONS_BID_BATCH_WINDOW", 0.01)
+# Seconds a caller waits for its batch to be committed
+RESULT_TIMEOUT = 10
+
+
+class BidPipeline:
+
+    def __init__(self, window=BATCH_WINDOW):
+        self.window = window
+        # listing id: current bid amount, None once the listing is closed
+        self.marks = {}
+        self.queue = []
+        self.lock = threading.Lock()
+        self.pending = threading.Condition(self.lock)
+        self.thread = None
+
+    def submit(self, listing_id, bidder_id, amount):
+        """
+        Return a Future of (placed, current bid amount) for the bid. Stale bids
+        are settled at once, accepted ones once their batch is committed.
+        Raises Listing.DoesNotExist for a missing listing, which gets no mark.
+        """
+        future = Future()
+        with self.lock:
+            if listing_id not in self.marks:
+                self.marks[listing_id] = self.load_mark(listing_id)
+            mark = self.marks[listing_id]
+            if mark is None or amount <= mark:
+                future.set_result((False, mark))
+                return future
+            self.marks[listing_id] = amount
+            self.queue.append((listing_id, bidder_id, amount, future))
+            self.start()
+            self.pending.notify()
+        return future
+
+    def place(self, listing_id, bidder_id, amount):
+        """Submit the bid and wait for its result"""
+        return self.submit(listing_id, bidder_id, amount).result(RESULT_TIMEOUT)
+
+    def forget(self, listing_id):
+        """Drop the mark of a listing, reloading it on its next bid"""
+        with self.lock:
+            self.marks.pop(listing_id, None)
+
+    @staticmethod
+    def load_mark(listing_id):
+        """
+        Return the current bid amount of a listing, None if it is closed.
+        Raises Listing.DoesNotExist.
+        """
+        listing = Listing.objects.only("highest_bid_amount", "starting_bid", "active").get(pk=listing_id)
+        if not listing.active:
+            return None
+        return listing.current_bid_amount
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name="bid-pipeline", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        try:
+            while True:
+                with self.lock:
+                    while not self.queue:
+                        self.pending.wait()
+                # Let the batch fill for the rest of the window
+                time.sleep(self.window)
+                with self.lock:
+                    batch, self.queue = self.queue, []
+                self.flush(batch)
+        finally:
+            connection.close()
+
+    def flush(self, batch):
+        """Commit a batch of accepted bids, settling their futures"""
+        by_listing = defaultdict(list)
+        for bid in batch:
+            by_listing[bid[0]].append(bid)
+        for listing_id, bids in by_listing.items():
+            try:
+                results = self.commit(listing_id, bids)
+            except Exception as e:
+                self.forget(listing_id)
+                for *_, future in bids:
+                    future.set_exception(e)
+                continue
+            for (*_, future), result in zip(bids, results):
+                future.set_result(result)
+
+    def commit(self, listing_id, bids):
+        """
+        Store the queued bids on a listing and return the (placed, current bid
+        amount) of each
+        """
+        amounts = [amount for _, _, amount, _ in bids]
+        # Queued amounts only increase unless the mark was dropped meanwhile
+        if all(a < b for a, b in zip(amounts, amounts[1:])):
+            with transaction.atomic():
+                # Fast path: every queued bid beats the stored one
+                if Listing.objects.filter(Listing.outbid_by(amounts[0]), pk=listing_id, active=True).update(
+                        highest_bid_amount=amounts[-1], highest_bidder=bids[-1][1]):
+                    Bid.objects.bulk_create(
+                        [Bid(listing_id=listing_id, bidder_id=bidder_id, amount=amount)
+                         for _, bidder_id, amount, _ in bids])
+                    listing_changed(listing_id)
+                    return [(True, amount) for amount in amounts]
+
+        # A bid placed outside the pipeline got in first, place them one by one
+        self.forget(listing_id)
+        listing = Listing(pk=listing_id)
+        placed = [listing.place_bid(Bid(bidder_id=bidder_id, amount=amount))
+                  for _, bidder_id, amount, _ in bids]
+        current = self.load_mark(listing_id)
+        return [(ok, amount if ok else current) for ok, amount in zip(placed, amounts)]
+
+
+pipeline = BidPipeline()
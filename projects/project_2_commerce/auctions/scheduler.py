@@ -0,0 +1,72 @@
+"""
+Automatic closing of listings at their end date, run by the close_listings
+command.
+
+CloseScheduler keeps the (end date, id) of the open listings with an end
+date in a heap, so each tick only pops the listings now due and closes them
+with one UPDATE, which also records their winning bid. The open listings
+with an end date are read once at start; afterwards each tick only fetches
+those created since, by primary key. An end date moved later after loading is noticed
+when the old one comes due, one moved earlier only on restart.
+"""
+import heapq
+import time
+
+from django.utils import timezone
+
+from .models import Listing
+
+# Listings loaded per query and closed per UPDATE
+BATCH_SIZE = 1000
+
+
+class CloseScheduler:
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.heap = []
+        self.last_id = 0
+
+    def load(self):
+        """Push the open listings with an end date created since the last load"""
+        while True:
+            rows = list(
+                Listing.objects.filter(pk__gt=self.last_id, active=True, end_date__isnull=False)
+                .order_by('pk').values_list('pk', 'end_date')[:self.batch_size]
+            )
+            for pk, end_date in rows:
+                heapq.heappush(self.heap, (end_date, pk))
+            if rows:
+                self.last_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                return
+
+    def next_due(self):
+        """Return the earliest end date scheduled, None if there is none"""
+        return self.heap[0][0] if self.heap else None
+
+    def tick(self, now=None):
+        """Close the listings due by now, returning how many were closed"""
+        now = now or timezone.now()
+        self.load()
+        closed = 0
+        while self.heap and self.heap[0][0] <= now:
+            due = []
+            while self.heap and self.heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self.heap)[1])
+            closed += Listing.objects.filter(pk__in=due, end_date__lte=now).close()
+            # Reschedule listings whose end date was moved later
+            moved = Listing.objects.filter(pk__in=due, active=True, end_date__gt=now).order_by()
+            for row in moved.values_list('end_date', 'pk'):
+                heapq.heappush(self.heap, row)
+        return closed
+
+    def run(self, interval, on_tick=lambda closed: None):
+        """Tick until interrupted, at most interval seconds apart"""
+        while True:
+            on_tick(self.tick())
+            next_due = self.next_due()
+            wait = interval
+            if next_due is not None:
+                wait = min(interval, max((next_due - timezone.now()).total_seconds(), 0))
+            time.sleep(wait)
@@ -0,0 +1,86 @@
+from collections import Counter
+
+
+def bid_deleted(sender, instance, **kwargs):
+    """Recompute the listing's highest bid when a Bid is deleted"""
+
+    # post_delete.connect specified in apps.py
+    from .models import Listing
+
+    if instance.listing_id is not None:
+        Listing(pk=instance.listing_id).refresh_highest_bid()
+
+
+def listing_saved(sender, instance, **kwargs):
+    """Drop the cached page of a saved or deleted listing"""
+
+    # post_save/post_delete.connect specified in apps.py
+    from .listing_cache import listing_changed
+
+    listing_changed(instance.pk)
+
+
+def listing_deleted(sender, instance, **kwargs):
+    """Drop the bid pipeline's mark of a deleted listing"""
+
+    # post_delete.connect specified in apps.py
+    from .pipeline import pipeline
+
+    pipeline.forget(instance.pk)
+
+
+def comment_saved(sender, instance, **kwargs):
+    """Drop the cached page of the listing of a saved or deleted comment"""
+
+    # post_save/post_delete.connect specified in apps.py
+    from .listing_cache import listing_changed
+
+    listing_changed(instance.listing_id)
+
+
+def category_saved(sender, instance, created, raw=False, **kwargs):
+    """Drop the cached pages of a saved category's listings, which show its name"""
+
+    # post_save.connect specified in apps.py
+    from .listing_cache import listing_changed
+    from .models import Listing
+
+    if not created and not raw:
+        listing_changed(*Listing.objects.filter(category=instance).values_list("pk", flat=True))
+
+
+def listing_state_loaded(sender, instance, raw=False, **kwargs):
+    """Keep the stored category and state of a listing about to be saved or deleted"""
+
+    # pre_save/pre_delete.connect specified in apps.py
+    instance._counted_state = None
+    if not raw and instance.pk is not None:
+        instance._counted_state = sender.objects.filter(pk=instance.pk).values_list("category", "active").first()
+
+
+def listing_counted(sender, instance, created, raw=False, **kwargs):
+    """Move a saved listing between the active listing counts of the categories"""
+
+    # post_save.connect specified in apps.py
+    from .models import Category
+
+    if raw:
+        return
+    deltas = Counter()
+    before = getattr(instance, "_counted_state", None)
+    if before is not None and before[1]:
+        deltas[before[0]] -= 1
+    if instance.active:
+        deltas[instance.category_id] += 1
+    Category.adjust_active_counts(deltas)
+
+
+def listing_uncounted(sender, instance, **kwargs):
+    """Take a deleted active listing off its category's active listing count"""
+
+    # post_delete.connect specified in apps.py
+    from .models import Category
+
+    before = getattr(instance, "_counted_state", None)
+    if before is not None and before[1]:
+        Category.adjust_active_counts({before[0]: -1})
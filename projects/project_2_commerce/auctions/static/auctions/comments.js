@@ -0,0 +1,46 @@
+// Load the next pages of a listing's comments as the user scrolls to them
+document.addEventListener('DOMContentLoaded', () => {
+    const button = document.querySelector('#more_comments');
+    if (!button) {
+        return;
+    }
+    const list = document.querySelector('#comments');
+    let loading = false;
+
+    function addComment(comment) {
+        const item = document.createElement('li');
+        const title = document.createElement('b');
+        title.textContent = `Comment ${comment.id}`;
+        const byline = document.createElement('i');
+        byline.textContent = `(${comment.commenter} on ${comment.comment_date})`;
+        item.append(title, document.createElement('br'), comment.detail, document.createElement('br'), byline);
+        list.append(item);
+    }
+
+    function loadMore() {
+        if (loading || !button.dataset.cursor) {
+            return;
+        }
+        loading = true;
+        fetch(`${button.dataset.url}?cursor=${encodeURIComponent(button.dataset.cursor)}`)
+        .then(response => response.json())
+        .then(result => {
+            result.comments.forEach(addComment);
+            if (result.next_cursor) {
+                button.dataset.cursor = result.next_cursor;
+            } else {
+                button.remove();
+                observer.disconnect();
+            }
+        })
+        .finally(() => loading = false);
+    }
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMore();
+        }
+    });
+    observer.observe(button);
+    button.addEventListener('click', loadMore);
+});
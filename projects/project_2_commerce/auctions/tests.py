@@ -1,3 +1,502 @@
-from django.test import TestCase
+import threading
+from io import StringIO
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Bid, Category, Comment, Listing, User, Watchlist
+from .pagination import comments_page
+from .pipeline import BidPipeline, pipeline
+from .scheduler import CloseScheduler
+
+
+class HighestBidTestCase(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Books")
+        self.seller = User.objects.create_user("seller", password="password")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.other = User.objects.create_user("other", password="password")
+        self.listing = self.create_listing("Book")
+
+    def create_listing(self, name):
+        return Listing.objects.create(name=name, description=name, creator=self.seller,
+                                      category=self.category, starting_bid=10)
+
+    def test_place_bid_updates_highest_bid(self):
+        """
+        Verify an accepted bid is stored as the listing's highest bid
+        """
+        self.assertEqual(self.listing.current_bid_amount, 10)
+        self.assertTrue(self.listing.place_bid(Bid(amount=15, bidder=self.bidder)))
+        self.assertTrue(self.listing.place_bid(Bid(amount=20, bidder=self.other)))
+        listing = Listing.objects.get(pk=self.listing.pk)
+        self.assertEqual(listing.highest_bid_amount, 20)
+        self.assertEqual(listing.highest_bidder, self.other)
+        self.assertEqual(listing.current_bid_amount, 20)
+
+    def test_low_bid_rejected(self):
+        """
+        Verify bids not above the current bid are rejected and not saved
+        """
+        self.assertFalse(self.listing.place_bid(Bid(amount=10, bidder=self.bidder)))
+        self.assertTrue(self.listing.place_bid(Bid(amount=15, bidder=self.bidder)))
+        self.assertFalse(self.listing.place_bid(Bid(amount=15, bidder=self.other)))
+        self.assertEqual(self.listing.bids.count(), 1)
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).highest_bidder, self.bidder)
+
+    def test_bid_deleted(self):
+        """
+        Verify deleting a bid recomputes the listing's highest bid
+        """
+        self.listing.place_bid(Bid(amount=15, bidder=self.bidder))
+        self.listing.place_bid(Bid(amount=20, bidder=self.other))
+        self.listing.bids.get(amount=20).delete()
+        listing = Listing.objects.get(pk=self.listing.pk)
+        self.assertEqual((listing.highest_bid_amount, listing.highest_bidder), (15, self.bidder))
+        self.listing.bids.all().delete()
+        listing = Listing.objects.get(pk=self.listing.pk)
+        self.assertEqual((listing.highest_bid_amount, listing.highest_bidder), (None, None))
+        self.assertEqual(listing.current_bid_amount, 10)
+
+    def test_pages_constant_queries(self):
+        """
+        Verify the index, category and watchlist pages don't query per listing
+        """
+        watchlist = Watchlist.objects.create(user=self.bidder)
+        self.client.force_login(self.bidder)
+        urls = [
+            reverse("index"),
+            reverse("specific_category", args=[self.category.id]),
+            reverse("watchlist", args=[self.bidder.id]),
+        ]
+        counts = []
+        for name in ["first", "second", "third"]:
+            listing = self.create_listing(name)
+            listing.place_bid(Bid(amount=50, bidder=self.other))
+            watchlist.item.add(listing)
+            counts.append([self.count_queries(url) for url in urls])
+        self.assertEqual(counts[0], counts[-1])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+class ConcurrentBidTestCase(TransactionTestCase):
+
+    def test_concurrent_bids(self):
+        """
+        Verify bids placed at once from many threads leave exactly one highest bid
+        """
+        category = Category.objects.create(name="Books")
+        seller = User.objects.create_user("seller", password="password")
+        bidders = [User.objects.create_user(f"bidder-{i}", password="password") for i in range(16)]
+        listing = Listing.objects.create(name="Book", description="Book", creator=seller,
+                                         category=category, starting_bid=10)
+        # Every bidder places the same amounts, so most bids lose a race
+        amounts = [20, 30, 40, 50, 60]
+        barrier = threading.Barrier(len(bidders))
+        accepted = []
+        errors = []
+
+        def bid(bidder):
+            try:
+                barrier.wait()
+                for amount in amounts:
+                    if Listing(pk=listing.pk, starting_bid=10).place_bid(Bid(amount=amount, bidder=bidder)):
+                        accepted.append(amount)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=bid, args=(bidder,)) for bidder in bidders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        listing.refresh_from_db()
+        bids = list(listing.bids.order_by("id").values_list("amount", "bidder"))
+        # Each accepted bid beat the one before it, so no amount was accepted twice
+        self.assertEqual(sorted(accepted), [amount for amount, _ in bids])
+        self.assertEqual([amount for amount, _ in bids], sorted({amount for amount, _ in bids}))
+        self.assertEqual(listing.bids.filter(amount=max(amounts)).count(), 1)
+        self.assertEqual((listing.highest_bid_amount, listing.highest_bidder_id), bids[-1])
+
+
+class BidViewTestCase(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="Books")
+        self.user = User.objects.create_user("bidder", password="password")
+        self.listing = Listing.objects.create(name="Book", description="Book", category=category, starting_bid=10)
+        self.url = reverse("bid", args=[self.listing.id])
+
+    def test_bid(self):
+        """
+        Verify the bid endpoint places the user's bid and returns the result as JSON
+        """
+        self.assertEqual(self.client.post(self.url, {"amount": 20}).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(self.url, {"amount": "x"}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"amount": 20}).json(), {"placed": True, "current_bid": 20})
+        self.assertEqual(self.client.post(self.url, {"amount": 15}).json(), {"placed": False, "current_bid": 20})
+        self.assertEqual(self.listing.bids.get().bidder, self.user)
+
+    def test_missing_listing(self):
+        """
+        Verify a bid on a missing listing returns 404, with or without the pipeline
+        """
+        self.client.force_login(self.user)
+        url = reverse("bid", args=[0])
+        for enabled in (False, True):
+            with self.subTest(pipeline=enabled), override_settings(AUCTIONS_BID_PIPELINE=enabled):
+                self.assertEqual(self.client.post(url, {"amount": 20}).status_code, 404)
+
+
+class BidPipelineTestCase(TransactionTestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="Books")
+        self.users = [User.objects.create_user(f"bidder-{i}", password="password") for i in range(8)]
+        self.listing = Listing.objects.create(name="Book", description="Book", category=category, starting_bid=10)
+        self.pipeline = BidPipeline(window=0.05)
+
+    def test_stale_bids_rejected_in_memory(self):
+        """
+        Verify bids not above the high-water mark are rejected without queries
+        """
+        self.assertEqual(self.pipeline.place(self.listing.id, self.users[0].id, 20), (True, 20))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.pipeline.place(self.listing.id, self.users[1].id, 20), (False, 20))
+            self.assertEqual(self.pipeline.place(self.listing.id, self.users[1].id, 5), (False, 20))
+
+    def test_missing_listing(self):
+        """
+        Verify a bid on a missing or deleted listing raises, leaving no mark behind
+        """
+        with self.assertRaises(Listing.DoesNotExist):
+            self.pipeline.place(0, self.users[1].id, 50)
+        self.assertNotIn(0, self.pipeline.marks)
+        self.assertEqual(pipeline.place(self.listing.id, self.users[0].id, 20), (True, 20))
+        listing_id = self.listing.id
+        self.listing.delete()
+        self.assertNotIn(listing_id, pipeline.marks)
+        with self.assertRaises(Listing.DoesNotExist):
+            pipeline.place(listing_id, self.users[1].id, 30)
+
+    def test_batch_commit(self):
+        """
+        Verify bids submitted together are committed as one batch, highest last
+        """
+        results = [self.pipeline.submit(self.listing.id, user.id, 20 + i) for i, user in enumerate(self.users)]
+        self.assertEqual([future.result(5) for future in results], [(True, 20 + i) for i in range(8)])
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.highest_bid_amount, self.listing.highest_bidder), (27, self.users[-1]))
+        self.assertEqual(self.listing.bids.count(), 8)
+
+    def test_bid_outside_pipeline(self):
+        """
+        Verify a bid placed outside the pipeline is respected and reloads the mark
+        """
+        self.assertEqual(self.pipeline.place(self.listing.id, self.users[0].id, 20), (True, 20))
+        self.listing.place_bid(Bid(amount=40, bidder=self.users[1]))
+        self.assertEqual(self.pipeline.place(self.listing.id, self.users[2].id, 30), (False, 40))
+        self.assertEqual(self.pipeline.place(self.listing.id, self.users[2].id, 35), (False, 40))
+        self.assertEqual(self.pipeline.place(self.listing.id, self.users[2].id, 45), (True, 45))
+        self.assertEqual(list(self.listing.bids.order_by("id").values_list("amount", flat=True)), [20, 40, 45])
+
+
+class CloseSchedulerTestCase(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Books")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.now = timezone.now()
+
+    def create_listing(self, end_date):
+        return Listing.objects.create(name="Book", description="Book", category=self.category,
+                                      starting_bid=10, end_date=end_date)
+
+    def test_close_due_listings(self):
+        """
+        Verify a tick closes only the listings due, recording their winning bid
+        """
+        due = self.create_listing(self.now - timedelta(minutes=1))
+        due.place_bid(Bid(amount=20, bidder=self.bidder))
+        unsold = self.create_listing(self.now)
+        later = self.create_listing(self.now + timedelta(hours=1))
+        endless = self.create_listing(None)
+        closed = self.create_listing(self.now - timedelta(minutes=1))
+        Listing.objects.filter(pk=closed.pk).update(active=False)
+        scheduler = CloseScheduler(batch_size=2)
+        with self.assertNumQueries(8):
+            # Two pages of open listings loaded, the due ones closed and their category's
+            # count updated in a savepoint, one check for moved end dates
+            self.assertEqual(scheduler.tick(self.now), 2)
+        for listing in [due, unsold, later, endless]:
+            listing.refresh_from_db()
+        self.assertEqual((due.active, due.winning_bid), (False, due.bids.get()))
+        self.assertEqual((unsold.active, unsold.winning_bid), (False, None))
+        self.assertTrue(later.active and endless.active)
+        self.assertEqual(scheduler.next_due(), later.end_date)
+        self.assertFalse(due.place_bid(Bid(amount=30, bidder=self.bidder)))
+
+    def test_new_and_moved_listings(self):
+        """
+        Verify listings created after the first tick are picked up and moved end dates respected
+        """
+        scheduler = CloseScheduler()
+        self.assertEqual(scheduler.tick(self.now), 0)
+        moved = self.create_listing(self.now - timedelta(minutes=1))
+        new = self.create_listing(self.now - timedelta(minutes=1))
+        scheduler.load()
+        Listing.objects.filter(pk=moved.pk).update(end_date=self.now + timedelta(minutes=5))
+        self.assertEqual(scheduler.tick(self.now), 1)
+        self.assertFalse(Listing.objects.get(pk=new.pk).active)
+        self.assertEqual(scheduler.tick(self.now + timedelta(minutes=5)), 1)
+        self.assertFalse(Listing.objects.get(pk=moved.pk).active)
+
+    def test_command(self):
+        """
+        Verify the close_listings command closes the listings due
+        """
+        listing = self.create_listing(self.now - timedelta(minutes=1))
+        call_command("close_listings", stdout=StringIO())
+        listing.refresh_from_db()
+        self.assertFalse(listing.active)
+
+
+class ListingCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Books")
+        self.seller = User.objects.create_user("seller", password="password")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.listing = Listing.objects.create(name="Book", description="Book", creator=self.seller,
+                                              category=category, starting_bid=10)
+        self.url = reverse("listing", args=[self.listing.id])
+
+    def get(self, queries=None):
+        if queries is None:
+            return self.client.get(self.url)
+        with self.assertNumQueries(queries):
+            return self.client.get(self.url)
+
+    def test_anonymous_render_cached(self):
+        """
+        Verify an anonymous visitor's render of a cached listing runs no query
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.get()
+        response = self.get(0)
+        self.assertContains(response, "Books")
+        self.assertNotContains(response, "Place Bid")
+
+    def rename_category(self):
+        category = Category.objects.get(pk=self.listing.category_id)
+        category.name = "Old books"
+        category.save()
+
+    def test_invalidated(self):
+        """
+        Verify the cached page is dropped on a bid, a comment, a category rename and a close
+        """
+        self.get()
+        changes = [
+            (lambda: self.listing.place_bid(Bid(amount=25, bidder=self.bidder)), "$25"),
+            (lambda: Comment.objects.create(detail="Nice book", listing=self.listing, commenter=self.bidder),
+             "Nice book"),
+            (self.rename_category, "Old books"),
+            (lambda: Listing.objects.filter(pk=self.listing.pk).close(), "(Closed)"),
+        ]
+        for change, text in changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertContains(self.get(), text)
+
+    def test_user_bits(self):
+        """
+        Verify per-user parts are rendered on top of the cached page
+        """
+        self.listing.place_bid(Bid(amount=25, bidder=self.bidder))
+        self.get()
+        self.client.force_login(self.bidder)
+        response = self.get()
+        self.assertContains(response, "You are currently leading the bidding")
+        self.assertNotContains(response, "Close Bidding")
+        self.client.force_login(self.seller)
+        response = self.get()
+        self.assertContains(response, "Close Bidding")
+        self.assertNotContains(response, "You are currently leading the bidding")
+
+
+class WatchlistTestCase(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Books")
+        self.user = User.objects.create_user("watcher", password="password")
+        self.listings = [
+            Listing.objects.create(name=f"Book {i}", description="Book", category=self.category, starting_bid=10)
+            for i in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def test_user_without_watchlist(self):
+        """
+        Verify a user without a watchlist can view listings and start one
+        """
+        url = reverse("listing", args=[self.listings[0].id])
+        self.assertContains(self.client.get(url), "(Add to watchlist)")
+        self.client.post(url, {"add_remove": "add"})
+        self.assertContains(self.client.get(url), "(Remove from watchlist)")
+        self.client.post(url, {"add_remove": "remove"})
+        self.assertContains(self.client.get(url), "(Add to watchlist)")
+        self.assertEqual(Watchlist.objects.filter(user=self.user).count(), 1)
+
+    def test_watch_state_per_row(self):
+        """
+        Verify pages show the watch state of every listing with one watchlist query
+        """
+        watchlist = Watchlist.objects.create(user=self.user)
+        watchlist.item.add(self.listings[0], self.listings[2])
+        for url in [reverse("index"), reverse("specific_category", args=[self.category.id])]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertContains(response, "(Watching)", count=2)
+            self.assertEqual(sum("auctions_watchlist_item" in query["sql"] for query in queries), 1)
+        response = self.client.get(reverse("watchlist", args=[self.user.id]))
+        self.assertEqual(list(response.context["watched_listings"]), [self.listings[0], self.listings[2]])
+
+
+class CategoryPageTestCase(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Books")
+        self.other = Category.objects.create(name="Games")
+        self.bidder = User.objects.create_user("bidder", password="password")
+        self.now = timezone.now()
+
+    def create_listing(self, name, starting_bid=10, category=None, **fields):
+        return Listing.objects.create(name=name, description=name, category=category or self.category,
+                                      starting_bid=starting_bid, **fields)
+
+    def names(self, **params):
+        response = self.client.get(reverse("specific_category", args=[self.category.id]), params)
+        return [listing.name for listing in response.context["category_items"]]
+
+    def test_filter_and_sort(self):
+        """
+        Verify category pages filter by state and price and sort by end date, price or newest
+        """
+        cheap = self.create_listing("cheap", 5, pub_date=self.now - timedelta(days=2),
+                                    end_date=self.now + timedelta(days=2))
+        bid = self.create_listing("bid", 10, pub_date=self.now - timedelta(days=1),
+                                  end_date=self.now + timedelta(days=1))
+        bid.place_bid(Bid(amount=50, bidder=self.bidder))
+        self.create_listing("dear", 30, pub_date=self.now)
+        self.create_listing("closed", 20, active=False)
+        self.create_listing("game", 20, category=self.other)
+        self.assertEqual(self.names(), ["dear", "bid", "cheap"])
+        self.assertEqual(self.names(sort="ending"), ["bid", "cheap", "dear"])
+        self.assertEqual(self.names(sort="price"), ["cheap", "dear", "bid"])
+        self.assertEqual(self.names(sort="-price", min_price=10, max_price=40), ["dear"])
+        self.assertEqual(self.names(status="closed"), ["closed"])
+        self.assertEqual(sorted(self.names(status="all", sort="bogus", min_price="x")),
+                         ["bid", "cheap", "closed", "dear"])
+
+    def test_paginated(self):
+        """
+        Verify category pages are paginated, keeping the filters in the page links
+        """
+        for i in range(30):
+            self.create_listing(f"listing-{i}")
+        url = reverse("specific_category", args=[self.category.id])
+        response = self.client.get(url, {"sort": "price"})
+        self.assertEqual(len(response.context["category_items"]), 25)
+        self.assertContains(response, "?sort=price&page=2")
+        self.assertEqual(len(self.client.get(url, {"sort": "price", "page": 2}).context["category_items"]), 5)
+
+    def test_active_counts(self):
+        """
+        Verify the categories' active listing counts follow creates, moves, closes and deletes
+        """
+        def counts():
+            return list(Category.objects.order_by("id").values_list("active_count", flat=True))
+
+        listings = [self.create_listing(f"listing-{i}") for i in range(4)]
+        self.create_listing("closed", active=False)
+        self.assertEqual(counts(), [4, 0])
+        listings[0].category = self.other
+        listings[0].save()
+        self.assertEqual(counts(), [3, 1])
+        Listing.objects.filter(pk__in=[listings[0].pk, listings[1].pk]).close()
+        self.assertEqual(counts(), [2, 0])
+        listings[2].delete()
+        listings[1].delete()
+        self.assertEqual(counts(), [1, 0])
+        Category.objects.update(active_count=0)
+        Category.objects.recount()
+        self.assertEqual(counts(), [1, 0])
+        self.assertContains(self.client.get(reverse("categories")), "1 active listing")
+
+
+class CommentPaginationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Books")
+        self.users = [User.objects.create_user(f"commenter-{i}", password="password") for i in range(3)]
+        self.listing = Listing.objects.create(name="Book", description="Book", category=category, starting_bid=10)
+        now = timezone.now()
+        # Pairs of comments at the same time, ordered by id within the pair
+        self.comments = Comment.objects.bulk_create([
+            Comment(detail=f"comment-{i}", listing=self.listing, commenter=self.users[i % 3],
+                    comment_date=now + timedelta(minutes=i // 2))
+            for i in range(45)
+        ])
+
+    def test_keyset_pages(self):
+        """
+        Verify pages follow each other by (comment_date, id) with one query each
+        """
+        details, cursor = [], None
+        for expected in [20, 20, 5]:
+            with self.assertNumQueries(1):
+                comments, cursor = comments_page(self.listing, cursor)
+                details += [f"{comment.detail} {comment.commenter}" for comment in comments]
+            self.assertEqual(len(comments), expected)
+        self.assertIsNone(cursor)
+        self.assertEqual(details, [f"comment-{i} commenter-{i % 3}" for i in range(45)])
+        with self.assertRaises(ValueError):
+            comments_page(self.listing, "bogus")
+
+    def test_listing_page_and_endpoint(self):
+        """
+        Verify the listing page shows the first page and the endpoint returns the next ones as JSON
+        """
+        response = self.client.get(reverse("listing", args=[self.listing.id]))
+        self.assertContains(response, "comment-19")
+        self.assertNotContains(response, "comment-20")
+        self.assertContains(response, 'id="more_comments"')
+        url = reverse("comments", args=[self.listing.id])
+        result = self.client.get(url).json()
+        self.assertEqual(result["comments"][0]["detail"], "comment-0")
+        result = self.client.get(url, {"cursor": result["next_cursor"]}).json()
+        self.assertEqual([comment["detail"] for comment in result["comments"]],
+                         [f"comment-{i}" for i in range(20, 40)])
+        self.assertEqual(result["comments"][0]["commenter"], "commenter-2")
+        self.assertEqual(self.client.get(url, {"cursor": "bogus"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("comments", args=[0])).status_code, 404)
@@ -17,7 +17,9 @@ urlpatterns = [
     path("categories", views.categories_view, name="categories"),
     path("categories/<int:category_id>", views.specific_category_view, name="specific_category"),
     path("listing/<int:listing_id>/close", views.close_listing, name="close"),
+    path("listing/<int:listing_id>/bid", views.bid_view, name="bid"),
     path("listing/<int:listing_id>/comment", views.add_comment, name="add_comment"),
+    path("listing/<int:listing_id>/comments", views.comments_view, name="comments"),
     path("listing/<int:listing_id>", views.listing_view, name="listing"),
     # path("listing/<str:listing_id>", views.error, name="error"),
 
@@ -1,17 +1,28 @@
+from concurrent import futures
 from datetime import datetime
 import functools
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout, decorators
 from django.contrib import messages
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.paginator import Paginator
 from django.db import IntegrityError
 
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils import formats, timezone
 
-from .forms import BidForm, ListingForm
+from . import watchlist
+from .forms import BidForm, ListingFilterForm, ListingForm
+from .listing_cache import listing_page
 from .models import *
+from .pagination import comments_page
+from .pipeline import pipeline
+
+# Listings per category page
+CATEGORY_PAGE_SIZE = 25
 
 
 def verify_login(func):
@@ -26,6 +37,7 @@ def verify_login(func):
 def index(request, message=''):
     return render(request, "auctions/index.html",{
         "active_listings": Listing.objects.exclude(active=False).all(),
+        "watched": watchlist.watched_ids(request),
     })
 
 
@@ -104,25 +116,17 @@ def active_listings_view(request):
 
 def listing_view(request, listing_id):
 
-    try:
-        # Query listing_id, if none redirect to index
-        current_listing = Listing.objects.get(id=listing_id)
-        comments = current_listing.comments.all()
-    except ObjectDoesNotExist:
+    # Shared parts of the page, if none redirect to index
+    page = listing_page(listing_id)
+    if page is None:
         messages.error(request, "Listing doesn't exist")
         return HttpResponseRedirect(reverse('index'))
-
-    if request.user.is_authenticated:
-        # If logged in, query watchlist
-        in_watchlist = Watchlist.objects.filter(user=request.user, item=listing_id).exists()
-        users_watchlist = Watchlist.objects.get(user=request.user)
-    else:
-        in_watchlist = None
+    current_listing = page["listing"]
 
     if request.method == "POST":
         # Check if adding/removing from watchlist
-        if add_remove := request.POST.get("add_remove", ""):
-            users_watchlist.add_remove_item(listing_id, add_remove)
+        if (add_remove := request.POST.get("add_remove", "")) and request.user.is_authenticated:
+            watchlist.add_remove(request, listing_id, add_remove)
 
         # Read submitted bid and place if valid
         bid_form = BidForm(request.POST)
@@ -139,24 +143,19 @@ def listing_view(request, listing_id):
 
     return render(request, "auctions/listing.html", {
         "listing": current_listing,
-        "comments": comments,
-        "in_watchlist": in_watchlist,
+        "details": page["details"],
+        "comments": page["comments"],
+        "in_watchlist": listing_id in watchlist.watched_ids(request),
         "bid_form": BidForm,
     })
 
 
 @decorators.login_required
 def watchlist_view(request, user_id):
-    watchlist_owner = User.objects.get(id=user_id)
-    if watchlist_owner == request.user:
-        try:
-            watchlist = Watchlist.objects.get(user=watchlist_owner)
-        except ObjectDoesNotExist:
-            watchlist = ""
-
+    if user_id == request.user.id:
         return render(request, "auctions/watchlist.html", {
-            "owner": watchlist_owner,
-            "watchlist": watchlist,
+            "owner": request.user,
+            "watched_listings": Listing.objects.filter(watchers__user=request.user).distinct(),
         })
     else:
         messages.error(request, "Login to view your watchlist")
@@ -170,19 +169,81 @@ def categories_view(request):
     })
 
 def specific_category_view(request, category_id):
-    category_items = Listing.objects.filter(category=category_id)
-    # category_name = Category.objects.get(category_id).name
+    category = Category.objects.filter(id=category_id).first()
+    if category is None:
+        messages.error(request, "Category doesn't exist")
+        return HttpResponseRedirect(reverse('categories'))
+
+    filter_form = ListingFilterForm(request.GET)
+    category_items = filter_form.filter(Listing.objects.filter(category=category))
+    page = Paginator(category_items, CATEGORY_PAGE_SIZE).get_page(request.GET.get("page"))
+    # Filters kept by the page links
+    query = request.GET.copy()
+    query.pop("page", None)
     return render(request, "auctions/specific_category.html", {
-        "category_items": category_items,
-        # "category_name": category_name,
+        "category_items": page,
+        "category_name": category.name,
+        "filter_form": filter_form,
+        "query": query.urlencode(),
+        "watched": watchlist.watched_ids(request),
+    })
+
+
+def bid_view(request, listing_id):
+    """Place a bid of the user, returning whether it was placed and the current bid as JSON"""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required."}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Login required."}, status=403)
+    try:
+        amount = int(request.POST["amount"])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Invalid amount."}, status=400)
+
+    if settings.AUCTIONS_BID_PIPELINE:
+        try:
+            placed, current_bid = pipeline.place(listing_id, request.user.id, amount)
+        except ObjectDoesNotExist:
+            return JsonResponse({"error": "Listing doesn't exist."}, status=404)
+        except futures.TimeoutError:
+            return JsonResponse({"error": "Bid not processed in time."}, status=503)
+    else:
+        try:
+            current_listing = Listing.objects.get(id=listing_id)
+        except ObjectDoesNotExist:
+            return JsonResponse({"error": "Listing doesn't exist."}, status=404)
+        placed = current_listing.place_bid(Bid(amount=amount, bidder=request.user))
+        if not placed:
+            current_listing.refresh_from_db(fields=["highest_bid_amount", "highest_bidder"])
+        current_bid = current_listing.current_bid_amount
+
+    return JsonResponse({"placed": placed, "current_bid": current_bid})
+
+
+def comments_view(request, listing_id):
+    """Return a page of a listing's comments, after the cursor, as JSON"""
+    listing = Listing.objects.filter(id=listing_id).first()
+    if listing is None:
+        return JsonResponse({"error": "Listing doesn't exist."}, status=404)
+    try:
+        comments, next_cursor = comments_page(listing, request.GET.get("cursor"))
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+    return JsonResponse({
+        "comments": [{
+            "id": comment.id,
+            "detail": comment.detail,
+            "commenter": str(comment.commenter),
+            "comment_date": formats.date_format(timezone.localtime(comment.comment_date), "DATETIME_FORMAT"),
+        } for comment in comments],
+        "next_cursor": next_cursor,
     })
 
 
 def close_listing(request, listing_id):
     if request.method == "POST":
-        current_listing = Listing.objects.get(id=listing_id)
-        current_listing.active = False
-        current_listing.save()
+        Listing.objects.filter(id=listing_id).close()
+        pipeline.forget(listing_id)
         messages.success(request, "This listing has been closed")
 
     return HttpResponseRedirect(reverse(
@@ -0,0 +1,34 @@
+"""
+The request user's watchlist, loaded once per request.
+
+watched_ids() returns the ids of the listings the user watches as a set,
+loaded with one query the first time it's called for a request and
+memoized on it, so any page can show the watch state of every listing it
+lists without further queries.
+"""
+from .models import Watchlist
+
+
+def watched_ids(request):
+    """Return the set of ids of the listings watched by the request user"""
+    if not hasattr(request, "_watched_ids"):
+        ids = set()
+        if request.user.is_authenticated:
+            ids = set(
+                Watchlist.item.through.objects.filter(watchlist__user=request.user)
+                .values_list("listing_id", flat=True)
+            )
+        request._watched_ids = ids
+    return request._watched_ids
+
+
+def add_remove(request, listing_id, add_remove):
+    """Add or remove a listing from the request user's watchlist, creating it if needed"""
+    watchlist = Watchlist.objects.filter(user=request.user).first()
+    if watchlist is None:
+        watchlist = Watchlist.objects.create(user=request.user)
+    watchlist.add_remove_item(listing_id, add_remove)
+    if add_remove == "add":
+        watched_ids(request).add(listing_id)
+    elif add_remove == "remove":
+        watched_ids(request).discard(listing_id)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'commerce.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +52,32 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query count, SQL/template time and response size, reported in
+# Server-Timing headers and flushed to INSTRUMENTATION_FILE, see
+# commerce/instrumentation.py. Set INSTRUMENTATION_ENABLED=1 to turn it on.
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED') == '1'
+INSTRUMENTATION_FILE = BASE_DIR / 'instrumentation.jsonl'
+INSTRUMENTATION_FLUSH_INTERVAL = 60
+INSTRUMENTATION_REPEATED_QUERIES = 5
+
+# Take bids posted to the bid endpoint through the in-process ingestion
+# pipeline, committing them in batches every AUCTIONS_BID_BATCH_WINDOW
+# seconds, see auctions/pipeline.py. Set AUCTIONS_BID_PIPELINE=1 to turn it on.
+AUCTIONS_BID_PIPELINE = os.environ.get('AUCTIONS_BID_PIPELINE') == '1'
+AUCTIONS_BID_BATCH_WINDOW = 0.01
+
+# Cache of the shared parts of listing pages, see auctions/listing_cache.py.
+# Any configured cache can be named here, e.g. a shared one when running
+# several processes.
+AUCTIONS_LISTING_CACHE = 'default'
+AUCTIONS_LISTING_CACHE_TIMEOUT = 300
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
@@ -78,6 +106,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than shared in-memory database, whose table locks fail
+        # concurrent writers at once instead of waiting as in production
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+
+
+class InstrumentationWiringTestCase(TestCase):
+    """The middleware itself is tested in project4/test_instrumentation.py"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "instrumentation.jsonl")
+
+    def test_wired_first(self):
+        """
+        Verify the project's MIDDLEWARE runs it first, reporting on every request once enabled
+        """
+        self.assertEqual(settings.MIDDLEWARE[0], "commerce.instrumentation.InstrumentationMiddleware")
+        self.assertNotIn("Server-Timing", self.client.get("/"))
+        # A client loads the middleware chain on its first request
+        with override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_FILE=self.path):
+            response = Client().get("/")
+        self.assertIn("Server-Timing", response)